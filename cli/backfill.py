@@ -0,0 +1,212 @@
+"""
+Backfill of a source over a range of src_time values
+Usage: python -m <package>.cli.backfill src_tag start end [--step 1d] [--product master] [--workers 4]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from dateutil import relativedelta
+
+from .process_sources import process_source, DATE_FORMAT_SOURCE
+from ..processing.sources_configuration_files import read_yaml
+from ..processing.workers import init_worker
+
+logger = logging.getLogger(__name__)
+
+# Number of dates processed at the same time
+BACKFILL_WORKERS = 4
+
+# Units of the step, e.g. 1d, 2w, 1m
+STEP_UNITS = {
+    'h': 'hours',
+    'd': 'days',
+    'w': 'weeks',
+    'm': 'months',
+    'y': 'years'
+}
+
+
+def backfill_dates(start: str, end: str, step: str = '1d') -> list:
+    """
+    Dates of the backfill, from start to end (included)
+    :param start: first date, on the format %Y%m%d_%H%M%S
+    :param end: last date, on the format %Y%m%d_%H%M%S
+    :param step: number and unit (h, d, w, m or y), e.g. 1d
+    :return: dates on the format %Y%m%d_%H%M%S
+    """
+    match = re.fullmatch(r'(\d+)([hdwmy])', step)
+    assert match is not None and int(match.group(1)) > 0, \
+        "The step must be a positive number followed by one of {}".format(list(STEP_UNITS.keys()))
+    try:
+        start_date = datetime.strptime(start, DATE_FORMAT_SOURCE)
+        end_date = datetime.strptime(end, DATE_FORMAT_SOURCE)
+    except ValueError:
+        raise ValueError("The start and end must be on the format: {0}".format(DATE_FORMAT_SOURCE))
+    assert start_date <= end_date, "The start must be before the end"
+
+    delta = relativedelta.relativedelta(**{STEP_UNITS[match.group(2)]: int(match.group(1))})
+    dates = []
+    i = 0
+    date = start_date
+    while date <= end_date:
+        dates.append(date.strftime(DATE_FORMAT_SOURCE))
+        i += 1
+        # Always from the start, so the months keep the day of the start
+        date = start_date + delta * i
+    return dates
+
+
+def resolve_raw_files(source_setup: dict, dates: list) -> dict:
+    """
+    Raw file of each date, for the sources read from files, as app selects it with a src_time
+    :param source_setup:
+    :param dates:
+    :return: path of the raw file of each date, empty for the other sources
+    """
+    from ..processing.workspace import DirectoryOperations
+
+    raw_source = source_setup['raw_source']
+    if raw_source['type']['specifics'] != 'file' or 'quality' in raw_source['type'].keys():
+        return {}
+    load_parameters = raw_source['load_parameters']
+    return DirectoryOperations.select_close_files_by_dates(
+        load_parameters['path'],
+        load_parameters['file_name'],
+        dates,
+        date_format=DATE_FORMAT_SOURCE,
+        structure='{0}_{0}_{1}'.format('{}', load_parameters['file_type']))
+
+
+def run_date(src_tag: str, src_time: str, file_path: str, source_setup: dict, app_params: dict) -> dict:
+    """
+    Processes one date of the backfill. Module level function so it can run on a process pool
+    :param src_tag:
+    :param src_time:
+    :param file_path: raw file of the date, empty for the sources read from queries
+    :param source_setup:
+    :param app_params: parameters of process_source
+    :return: summary of the date
+    """
+    start = time.perf_counter()
+    try:
+        summary = process_source(src_tag, src_time=src_time, file_path=file_path, source_setup=source_setup,
+                                 **app_params)
+    except Exception as e:
+        logger.exception(e)
+        summary = {'successful': False, 'processed': True, 'rows': 0, 'error': repr(e)}
+    summary.update(src_time=src_time, seconds=round(time.perf_counter() - start, 3))
+    return summary
+
+
+def progress_path(source_setup: dict, product: str, src_tag: str, dates: list, step: str) -> str:
+    """
+    File with the dates already processed by a backfill, on the output folder of the source
+    :param source_setup:
+    :param product:
+    :param src_tag:
+    :param dates:
+    :param step:
+    :return:
+    """
+    from ..processing.workspace import DirectoryOperations
+
+    save_parameters = source_setup['processed_source']['save_parameters']
+    folder = os.path.join(save_parameters['path'], product, save_parameters['tag'])
+    DirectoryOperations.check_dir(save_parameters['path'], product)
+    DirectoryOperations.check_dir(os.path.join(save_parameters['path'], product), save_parameters['tag'])
+    return os.path.join(folder, '.backfill_{}_{}_{}_{}.json'.format(src_tag, dates[0], dates[-1], step))
+
+
+def backfill(src_tag: str, start: str, end: str, step: str = '1d', product: str = 'master',
+             workers: int = BACKFILL_WORKERS, keep_connections: bool = False, **app_params) -> list:
+    """
+    Processes a source for every date between start and end.
+    The yaml is read and the raw files of the dates are selected once, and the dates run on a process pool with at most
+    workers at the same time. The outputs have the date of the backfill on the name, as app with a src_time.
+    The dates already processed are saved on a progress file, so a backfill that stopped continues from the dates
+    missing, resuming them from their checkpoints (see app) when the source has the checkpoints on its conf_file
+    :param src_tag:
+    :param start: first date, on the format %Y%m%d_%H%M%S
+    :param end: last date, on the format %Y%m%d_%H%M%S
+    :param step: number and unit (h, d, w, m or y), e.g. 1d
+    :param product:
+    :param workers: maximum number of dates processed at the same time
+    :param keep_connections: each process reuses its database connection on its dates, dropping the temporary
+    tables of each query
+    :param app_params: parameters of process_source, e.g. user, password, env, date_part
+    :return: summary of each date processed, by the order they finished
+    """
+    assert type(workers) == int and workers > 0, "The workers must be a positive int"
+    dates = backfill_dates(start, end, step)
+    source_setup = read_yaml(src_tag, 'shyness.params.{}'.format(product))
+    assert len(source_setup) > 0, "The source {} doesn't have a yaml on {}".format(src_tag, product)
+    raw_files = resolve_raw_files(source_setup, dates)
+
+    path = progress_path(source_setup, product, src_tag, dates, step)
+    done = []
+    resume = False
+    if os.path.exists(path):
+        resume = bool(source_setup['conf_file'].get('checkpoints', False))
+        with open(path) as file:
+            done = json.load(file)['done']
+    pending = [x for x in dates if x not in done]
+    logger.info("Backfill of {} with {} dates, {} already processed, on {} processes".format(
+        src_tag, len(dates), len(dates) - len(pending), workers))
+
+    summary = []
+    app_params = dict(app_params, product=product, resume=resume)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(keep_connections,)) as executor:
+        futures = [executor.submit(run_date, src_tag, src_time, raw_files.get(src_time, ''), source_setup, app_params)
+                   for src_time in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            summary.append(result)
+            # The dates with an output already up to date aren't processed again
+            if result['successful'] or (result['error'] == '' and not result['processed']):
+                done.append(result['src_time'])
+                with open(path, 'w') as file:
+                    json.dump({'done': sorted(done)}, file, indent=4)
+            logger.info("{} {} in {:.1f}s".format(result['src_time'], 'ok' if result['successful'] else 'failed',
+                                                  result['seconds']))
+
+    failed = [x['src_time'] for x in summary if x['src_time'] not in done]
+    if len(failed) == 0:
+        os.remove(path)
+        logger.info("Backfill of {} finished".format(src_tag))
+    else:
+        logger.error("Backfill of {} failed on {}, run it again to continue".format(src_tag, failed))
+    return summary
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description='Backfill of a source over a range of src_time values')
+    parser.add_argument('src_tag')
+    parser.add_argument('start', help='first date, e.g. 20210101_000000')
+    parser.add_argument('end', help='last date, e.g. 20210131_000000')
+    parser.add_argument('--step', default='1d', help='number and unit (h, d, w, m or y), e.g. 1d')
+    parser.add_argument('--product', default='master')
+    parser.add_argument('--workers', type=int, default=BACKFILL_WORKERS)
+    parser.add_argument('--user', default='')
+    parser.add_argument('--password', default=os.environ.get('DATAPRO_PASSWORD', ''))
+    parser.add_argument('--env', default='dev')
+    parser.add_argument('--date_part', default='')
+    parser.add_argument('--keep_connections', action='store_true',
+                        help='each process reuses its database connection on its dates')
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s -> %(name)s : %(levelname)s | %(message)s')
+
+    summary = backfill(args.src_tag, args.start, args.end, args.step, args.product, args.workers,
+                       args.keep_connections, user=args.user, password=args.password, env=args.env,
+                       date_part=args.date_part)
+    if len([x for x in summary if not x['successful'] and (x['error'] != '' or x['processed'])]) > 0:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Processing of a batch of sources of a product, with the sources that are auxiliary sources of other ones (insert_into
+of the query_manipulation) processed first
+Usage: python -m <package>.cli.batch_sources product ['sales_*'] [--workers 4] [--summary_path summary.json]
+"""
+import argparse
+import fnmatch
+import importlib.util
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from .process_sources import process_source
+from ..processing.sources_configuration_files import read_yaml
+
+logger = logging.getLogger(__name__)
+
+# Number of sources processed at the same time
+BATCH_WORKERS = 4
+
+
+def select_sources(product: str, sources) -> list:
+    """
+    Tags of the sources of the batch
+    :param product:
+    :param sources: list of src_tag's or a glob over the yaml files of the product, e.g. 'sales_*'
+    :return:
+    """
+    if type(sources) == list:
+        assert len([x for x in sources if type(x) != str]) == 0, "The sources must be strings"
+        return sources
+    assert type(sources) == str, "The sources must be a list or a glob"
+
+    package_name = 'shyness.params.{}'.format(product)
+    spec = importlib.util.find_spec(package_name)
+    assert spec is not None and spec.submodule_search_locations is not None, \
+        "The package {} doesn't exist".format(package_name)
+    src_tags = []
+    for folder in spec.submodule_search_locations:
+        src_tags.extend([os.path.splitext(x)[0] for x in os.listdir(folder) if x.endswith('.yaml')])
+    return sorted(x for x in set(src_tags) if fnmatch.fnmatch(x, sources))
+
+
+def source_dependencies(source_setup: dict, product: str) -> set:
+    """
+    Clean sources of the product read by the source as auxiliary sources, on the insert_into of the
+    query_manipulation. The prep sources aren't processed by the batch, so they aren't dependencies
+    :param source_setup:
+    :param product:
+    :return: src_tag's of the dependencies
+    """
+    dependencies = set()
+    if 'query_manipulation' not in source_setup.keys():
+        return dependencies
+    for query_params in source_setup['query_manipulation'].values():
+        if 'insert_into' not in query_params.keys():
+            continue
+        for temp_file_params in query_params['insert_into'].values():
+            if 'clean_source' in temp_file_params.keys() and \
+                    ('product' not in temp_file_params.keys() or temp_file_params['product'] == product):
+                dependencies.add(temp_file_params['clean_source'])
+    return dependencies
+
+
+def build_dag(product: str, src_tags: list) -> dict:
+    """
+    Dependencies of each source inside the batch, the other ones must be already processed
+    :param product:
+    :param src_tags:
+    :return: set of src_tag's each source waits for
+    """
+    package_name = 'shyness.params.{}'.format(product)
+    dag = {}
+    for src_tag in src_tags:
+        source_setup = read_yaml(src_tag, package_name)
+        assert len(source_setup) > 0, "The source {} doesn't have a yaml on {}".format(src_tag, package_name)
+        dag[src_tag] = source_dependencies(source_setup, product) & (set(src_tags) - {src_tag})
+
+    # Check for cycles, removing the sources without dependencies until there are none left
+    pending = {src_tag: set(dependencies) for src_tag, dependencies in dag.items()}
+    while len(pending) > 0:
+        ready = [src_tag for src_tag, dependencies in pending.items() if len(dependencies) == 0]
+        if len(ready) == 0:
+            raise ValueError("The sources {} have circular dependencies".format(sorted(pending.keys())))
+        for src_tag in ready:
+            del pending[src_tag]
+        for dependencies in pending.values():
+            dependencies.difference_update(ready)
+    return dag
+
+
+def run_source(src_tag: str, product: str, app_params: dict) -> dict:
+    """
+    Processes one source of the batch. Module level function so it can run on a process pool
+    :param src_tag:
+    :param product:
+    :param app_params: parameters of process_source
+    :return: summary of the source
+    """
+    start = time.perf_counter()
+    try:
+        summary = process_source(src_tag, product, **app_params)
+    except Exception as e:
+        logger.exception(e)
+        summary = {'successful': False, 'processed': True, 'rows': 0, 'error': repr(e)}
+    summary.update(src_tag=src_tag, seconds=round(time.perf_counter() - start, 3))
+    return summary
+
+
+def run_batch(product: str, sources, workers: int = BATCH_WORKERS, summary_path: str = None,
+              **app_params) -> list:
+    """
+    Processes a batch of sources of a product. The sources run on a process pool with at most workers at the same
+    time, and each one starts when the sources it depends on are processed. The sources that depend on a failed
+    one are skipped.
+    :param product:
+    :param sources: list of src_tag's or a glob over the yaml files of the product
+    :param workers: maximum number of sources processed at the same time
+    :param summary_path: json file to save the summary of the run
+    :param app_params: parameters of process_source, e.g. src_time, user, password, env
+    :return: summary of each source, by the order they finished
+    """
+    assert type(product) == str, "The product must be a string"
+    assert type(workers) == int and workers > 0, "The workers must be a positive int"
+
+    src_tags = select_sources(product, sources)
+    dag = build_dag(product, src_tags)
+    logger.info("Batch of {} sources of {} on {} processes".format(len(src_tags), product, workers))
+
+    summary = []
+    done = set()
+    failed = set()
+    waiting = dict(dag)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        while len(waiting) > 0 or len(running) > 0:
+            # Skip the sources with failed dependencies and submit the ready ones
+            for src_tag, dependencies in list(waiting.items()):
+                if len(dependencies & failed) > 0:
+                    del waiting[src_tag]
+                    failed.add(src_tag)
+                    logger.error("Skipping {}, the dependencies {} failed".format(src_tag,
+                                                                                 sorted(dependencies & failed)))
+                    summary.append({'src_tag': src_tag, 'successful': False, 'processed': False, 'rows': 0,
+                                    'error': 'dependencies failed: {}'.format(','.join(sorted(dependencies & failed))),
+                                    'seconds': 0})
+                elif dependencies <= done:
+                    del waiting[src_tag]
+                    running[executor.submit(run_source, src_tag, product, app_params)] = src_tag
+            if len(running) == 0:
+                continue
+
+            finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in finished:
+                src_tag = running.pop(future)
+                result = future.result()
+                summary.append(result)
+                if result['successful'] or (result['error'] == '' and not result['processed']):
+                    done.add(src_tag)
+                else:
+                    failed.add(src_tag)
+                logger.info("{} finished in {:.1f}s".format(src_tag, result['seconds']))
+
+    log_summary(summary, time.perf_counter() - start)
+    if summary_path is not None:
+        with open(summary_path, 'w') as file:
+            json.dump(summary, file, indent=4)
+    return summary
+
+
+def log_summary(summary: list, seconds: float) -> None:
+    """
+    Logs the summary of a batch
+    :param summary:
+    :param seconds: duration of the batch
+    :return:
+    """
+    n_failed = len([x for x in summary if not x['successful'] and (x['error'] != '' or x['processed'])])
+    logger.info("Batch finished in {:.1f}s: {} sources, {} failed".format(seconds, len(summary), n_failed))
+    for result in summary:
+        if result['successful']:
+            status = 'ok'
+        elif result['error'] == '' and not result['processed']:
+            status = 'updated'
+        else:
+            status = 'failed'
+        logger.info("{:<30} {:<8} {:>10} rows {:>8.1f}s {}".format(result['src_tag'], status, result['rows'],
+                                                                  result['seconds'], result['error']))
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description='Processing of a batch of sources of a product')
+    parser.add_argument('product')
+    parser.add_argument('sources', nargs='?', default='*', help="glob over the yaml files, e.g. 'sales_*'")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS)
+    parser.add_argument('--summary_path', default=None, help='json file to save the summary of the run')
+    parser.add_argument('--src_time', default='')
+    parser.add_argument('--user', default='')
+    parser.add_argument('--password', default=os.environ.get('DATAPRO_PASSWORD', ''))
+    parser.add_argument('--env', default='dev')
+    parser.add_argument('--date_part', default='')
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s -> %(name)s : %(levelname)s | %(message)s')
+
+    summary = run_batch(args.product, args.sources, args.workers, args.summary_path, src_time=args.src_time,
+                        user=args.user, password=args.password, env=args.env, date_part=args.date_part)
+    if len([x for x in summary if not x['successful'] and (x['error'] != '' or x['processed'])]) > 0:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark of the contact corrections of FileCorrections on a skewed synthetic file, with the ordered sets of
+EntityContacts and with the lists of contacts used before them
+Usage: python -m <package>.cli.contacts_benchmark [--lines 30000] [--hot_share 0.6] [--runs 3]
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from ..processing.data_quality import FileCorrections, EntityContacts
+
+# Columns of the synthetic file, the extra phone numbers are added before the phone column
+BENCHMARK_HEADER = 'id,name,phone,email,other'
+
+# Parameters of FileCorrections for the synthetic file
+BENCHMARK_QUALITY_PARAMS = {
+    'email_position': 2,
+    'phone_position': 2,
+    'id_position': 0,
+    'name_position': 1,
+    'possible_content_after_name': None
+}
+
+
+class ListContacts:
+    """
+    Contacts of each entity on lists, with the membership test on the list as before EntityContacts
+    """
+
+    def __init__(self) -> None:
+        self._contacts = {}
+
+    def has(self, entity_id: str, contact: str) -> bool:
+        return entity_id in self._contacts.keys() and contact in self._contacts[entity_id]
+
+    def add(self, entity_id: str, contact: str) -> bool:
+        contacts = self._contacts.setdefault(entity_id, [])
+        if contact in contacts:
+            return False
+        contacts.append(contact)
+        return True
+
+    def counts(self) -> dict:
+        return {entity_id: len(contacts) for entity_id, contacts in self._contacts.items()}
+
+
+def synthetic_file(folder: str, lines: int, hot_share: float, seed: int = 0) -> dict:
+    """
+    Writes a file where one entity (HOT) has hot_share of the lines, with extra phone columns, several phone numbers
+    and several emails on a cell
+    :param folder:
+    :param lines:
+    :param hot_share: share of the lines of the hot entity
+    :param seed:
+    :return: load parameters of the file
+    """
+    generator = random.Random(seed)
+    rows = [BENCHMARK_HEADER.replace(',', ';')]
+    for _ in range(lines):
+        entity_id = 'HOT' if generator.random() < hot_share else 'E{}'.format(generator.randint(0, 500))
+        extra_phones = ['9{:08d}'.format(generator.randint(0, 5000)) for _ in range(generator.choice([0, 0, 1, 2]))]
+        phones = '/'.join('9{:08d}'.format(generator.randint(0, 5000)) for _ in range(generator.choice([1, 2, 3])))
+        emails = ' '.join('u{}@x{}.com'.format(generator.randint(0, 3000), generator.randint(0, 3))
+                          for _ in range(generator.choice([1, 2])))
+        rows.append(';'.join([entity_id, 'n'] + extra_phones + [phones, emails, 'o']))
+    with open(os.path.join(folder, 'contacts.txt'), 'w', encoding='utf-8') as file:
+        file.write('\n'.join(rows) + '\n')
+    return {'path': folder, 'file_name': 'contacts', 'file_type': 'txt', 'encoding': 'utf-8', 'delimiter': ';',
+            'special_char': '"'}
+
+
+def run_corrections(load_params: dict, contacts_class) -> tuple:
+    """
+    Runs the corrections of the contacts with the trackers of contacts_class
+    :param load_params: see synthetic_file
+    :param contacts_class: EntityContacts or ListContacts
+    :return: seconds, corrected lines and contacts by entity of the phone numbers
+    """
+    corrections = FileCorrections(BENCHMARK_QUALITY_PARAMS, load_params, BENCHMARK_HEADER)
+    corrections._contacts_by_columns = contacts_class()
+    corrections._contacts_phone_number = contacts_class()
+    corrections._contacts_email = contacts_class()
+    start = time.perf_counter()
+    corrections.adjust_delimiters()
+    corrections.number_of_columns_by_contacts()
+    corrections.phone_number()
+    corrections.email()
+    return time.perf_counter() - start, corrections._corrected_lines, corrections._contacts_phone_number.counts()
+
+
+def benchmark(lines: int = 30000, hot_share: float = 0.6, runs: int = 3) -> dict:
+    """
+    Median of the corrections with the lists and with the ordered sets, on the same file
+    :param lines:
+    :param hot_share:
+    :param runs:
+    :return:
+    """
+    assert type(lines) == int and lines > 0, "The lines must be a positive int"
+    assert 0 <= hot_share <= 1, "The hot_share must be between 0 and 1"
+    assert type(runs) == int and runs > 0, "The runs must be a positive int"
+    folder = tempfile.mkdtemp()
+    try:
+        load_params = synthetic_file(folder, lines, hot_share)
+        lists = [run_corrections(load_params, ListContacts) for _ in range(runs)]
+        ordered_sets = [run_corrections(load_params, EntityContacts) for _ in range(runs)]
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    counts = ordered_sets[-1][2]
+    return {
+        'lists_seconds': statistics.median([x[0] for x in lists]),
+        'ordered_sets_seconds': statistics.median([x[0] for x in ordered_sets]),
+        'identical': lists[-1][1] == ordered_sets[-1][1],
+        'lines': len(ordered_sets[-1][1]),
+        'hot_contacts': counts.get('HOT', 0),
+        'entities': len(counts)
+    }
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark of the contact corrections on a skewed synthetic file')
+    parser.add_argument('--lines', type=int, default=30000)
+    parser.add_argument('--hot_share', type=float, default=0.6, help='share of the lines of the hot entity')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args(args)
+    # The corrections log each line with errors
+    logging.disable(logging.CRITICAL)
+
+    summary = benchmark(args.lines, args.hot_share, args.runs)
+    print("lists: {:.3f}s, ordered sets: {:.3f}s ({:.1f}x), identical output: {}".format(
+        summary['lists_seconds'], summary['ordered_sets_seconds'],
+        summary['lists_seconds'] / summary['ordered_sets_seconds'], summary['identical']))
+    print("{} lines corrected, {} entities with phone numbers, {} on the hot entity".format(
+        summary['lines'], summary['entities'], summary['hot_contacts']))
+
+
+if __name__ == '__main__':
+    main()
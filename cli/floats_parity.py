@@ -0,0 +1,137 @@
+"""
+Parity of the legacy and vectorised engines of Standardization.floats on messy samples, and time of both on a large
+column built from the samples
+Usage: python -m <package>.cli.floats_parity [--rows 200000]
+"""
+import argparse
+import logging
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from ..preparation.sources import Standardization
+
+# Columns of messy values and the decimal of the source. The rules of the thousands separators are taken for the whole
+# column, so each sample is parsed as one column
+PARITY_SAMPLES = {
+    'plain': (['1', '2.5', '-3', '10', '+5', '1e3', None, np.nan], None),
+    'decimal_comma': (['1,5', '0,05', '12,345', ' 3,5 ', '-2,75', '\t1,5'], ','),
+    'thousands_dot_decimal_comma': (['1.234,56', '12.345.678', '1.5', '3,25'], ','),
+    'thousands_comma': (['1,234.56', '12,345,678', '1.5'], '.'),
+    'single_comma_thousands': (['1,234', '1,5', '2.50'], '.'),
+    'percentages': (['12%', '3,5%', '100%', '0.5%'], None),
+    'sentinels': (['-1', '.', '5', '-1.0'], None),
+    'hours': (['10:30', ' 10:30', '1', '2,5', '23:59:59'], None),
+    'mixed_separators': (['1.234,56', '-1.234,56', '2,5', '7', '1.000.000,25'], None),
+    'spaces': ([' 1.5', '2.5 ', ' 7 ', ' 1,5 '], None),
+    'empty_with_plain': (['', '1', '2.5'], None),
+    'letters': (['abc', '1'], None)
+}
+
+# Documented differences: an empty value is always 0 on the vectorised engine, the legacy one returns NaN when the
+# column has percentages or more than one period (the replace of the whole column runs before the empty values are -1).
+# The vectorised engine removes the whitespace around the values, as the arrow backend, the legacy one raises on the
+# mixed separators with whitespace
+KNOWN_DIFFERENCES = {
+    'empty_with_percentages': ((['', '12%'], None), [0.0, 12.0]),
+    'empty_with_periods': ((['', '1.234.567'], None), [0.0, 1234567.0]),
+    'spaces_around_mixed': (([' 1.234,56', '1.234,56 ', ' . '], None), [1234.56, 1234.56, 0.0])
+}
+
+
+def parse(values: list, decimal, engine: str):
+    """
+    Floats of a column with an engine
+    :param values:
+    :param decimal:
+    :param engine: legacy or vectorised
+    :return: list of floats, or error when the engine raises
+    """
+    df = pd.DataFrame({'value': pd.Series(values, dtype=object)})
+    try:
+        return Standardization.floats(df, ['value'], decimal=decimal, engine=engine)['value'].astype(float).tolist()
+    except Exception:
+        return 'error'
+
+
+def same(left, right) -> bool:
+    """
+    Checks if two results of parse are equal, NaN included
+    :param left:
+    :param right:
+    :return:
+    """
+    if type(left) == str or type(right) == str:
+        return left == right
+    return len(left) == len(right) and bool(np.allclose(left, right, equal_nan=True))
+
+
+def parity() -> list:
+    """
+    Samples where the engines differ, and known differences where the vectorised engine isn't the documented value
+    :return: name, legacy and vectorised results of each difference
+    """
+    differences = []
+    for name, (values, decimal) in PARITY_SAMPLES.items():
+        legacy, vectorised = parse(values, decimal, 'legacy'), parse(values, decimal, 'vectorised')
+        if not same(legacy, vectorised):
+            differences.append((name, legacy, vectorised))
+    for name, ((values, decimal), expected) in KNOWN_DIFFERENCES.items():
+        vectorised = parse(values, decimal, 'vectorised')
+        if not same(expected, vectorised):
+            differences.append((name, parse(values, decimal, 'legacy'), vectorised))
+    return differences
+
+
+def timing(rows: int, seed: int = 0) -> dict:
+    """
+    Seconds of each engine on a column of random amounts with decimal comma and dotted thousands, some percentages
+    and missing values. The values are mostly unique, as the amounts of a real source
+    :param rows:
+    :param seed:
+    :return: seconds of each engine and if both have the same result
+    """
+    assert type(rows) == int and rows > 0, "The rows must be a positive int"
+    generator = np.random.default_rng(seed)
+    amounts = generator.uniform(-1e6, 1e6, rows).round(2)
+    kinds = generator.integers(0, 10, rows)
+    values = []
+    for amount, kind in zip(amounts, kinds):
+        value = '{:,.2f}'.format(amount).translate(str.maketrans({',': '.', '.': ','}))
+        values.append(None if kind == 0 else value + '%' if kind == 1 else value)
+    seconds = {}
+    results = {}
+    for engine in ['legacy', 'vectorised']:
+        start = time.perf_counter()
+        results[engine] = parse(values, ',', engine)
+        seconds[engine] = time.perf_counter() - start
+    return dict(seconds, same=same(results['legacy'], results['vectorised']))
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description='Parity of the engines of the floats standardization')
+    parser.add_argument('--rows', type=int, default=200000, help='rows of the timed column, 0 to skip it')
+    args = parser.parse_args(args)
+    # The legacy engine warns on each replace and the standardizations log each column
+    logging.disable(logging.CRITICAL)
+    warnings.simplefilter('ignore', FutureWarning)
+
+    differences = parity()
+    print("{} samples, {} known differences, {} unexpected differences".format(
+        len(PARITY_SAMPLES), len(KNOWN_DIFFERENCES), len(differences)))
+    for name, legacy, vectorised in differences:
+        print("{}: legacy {}, vectorised {}".format(name, legacy, vectorised))
+    seconds = {'same': True}
+    if args.rows > 0:
+        seconds = timing(args.rows)
+        print("{} rows: legacy {:.2f}s, vectorised {:.2f}s ({:.1f}x), same result: {}".format(
+            args.rows, seconds['legacy'], seconds['vectorised'], seconds['legacy'] / seconds['vectorised'],
+            seconds['same']))
+    if len(differences) > 0 or not seconds['same']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
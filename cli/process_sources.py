@@ -1,31 +1,22 @@
 import os
+import copy
 import logging
-import pandas as pd
 from datetime import datetime
 
-from ..preparation.sources import Standardization
-from ..preparation.sources import MaskData
+# Only the modules to decide if a source needs to be processed are loaded with the cli, pandas and the modules to
+# process the sources are loaded by the functions that use them
 from ..preparation.time_handlers import compare_refresh_rate
 from ..processing.sources_configuration_files import read_yaml, check_cols_data_types
-from ..processing.data_quality import FileCorrections
-from ..processing.upload import ReadFiles
-from ..processing.download import SaveData
 from ..processing.workspace import DirectoryOperations
+from ..processing.fingerprint import SourceFingerprint
 
 logger = logging.getLogger(__name__)
 
 DATE_FORMAT_SOURCE = "%Y%m%d_%H%M%S"
 
-FUNCTION_MAPPING = {
-    'date_cols': Standardization.dates,
-    'float_cols': Standardization.floats,
-    'nif_cols': Standardization.nifs,
-    'str_cols': Standardization.strings,
-    'int_cols': Standardization.ints,
-    'n_client_cols': Standardization.ints,
-    'mask_data': '',
-    'names': Standardization.columns_names
-}
+# Optional save_parameters of the parquet and feather files, see SaveData.write_file. The partitioned files are read
+# back grouped by partition, with the order of the source inside each partition
+COLUMNAR_SAVE_PARAMS = ['compression', 'row_group_size', 'partition_by']
 
 COLS_TAGS = {
     'data_types': {
@@ -141,7 +132,7 @@ def fix_yaml_columns(source_setup: dict, multilevel: bool = False, yaml_structur
     return source_setup
 
 
-def replace_data_types_tags(transform_params: dict, df: pd.DataFrame):
+def replace_data_types_tags(transform_params: dict, df: 'pd.DataFrame'):
     """
     Function to deal with tags present in transform_params dictionary:
     Available replace_tags:
@@ -234,25 +225,19 @@ def replace_data_types_tags(transform_params: dict, df: pd.DataFrame):
     return transform_params
 
 
-def transform(transform_params: dict, tag: str, df: pd.DataFrame) -> pd.DataFrame:
+def transform(transform_params: dict, tag: str, df: 'pd.DataFrame') -> 'pd.DataFrame':
     """
-    Function to deal with transform settings
+    Function to deal with transform settings. The data types are standardized by the StandardizationPlan, only the
+    names are transformed here
     :param df:
     :type df:
     :param tag:
     :type tag:
     :type transform_params: dict
     """
-    if transform_params[tag] is not None and tag != 'names':
-        logger.info("Star normalization of {}".format(tag))
-        if tag == 'date_cols':
-            dictionary = transform_params[tag]
-            df = FUNCTION_MAPPING[tag](df, dictionary, transform_params['optional'])
-        else:
-            columns = transform_params[tag].split(',')
-            df = FUNCTION_MAPPING[tag](df, columns, transform_params['optional'])
+    from ..preparation.sources import Standardization
 
-    elif tag == 'names':
+    if tag == 'names':
         if 'standardize_cols_names' not in transform_params.keys():
             if_needed = True
         else:
@@ -265,16 +250,220 @@ def transform(transform_params: dict, tag: str, df: pd.DataFrame) -> pd.DataFram
             # if you don't want this transformation if_needed = False
 
             columns = df.columns.tolist()
-            df = FUNCTION_MAPPING[tag](df, columns, if_needed)
+            df = Standardization.columns_names(df, columns, if_needed)
 
         elif tag in transform_params:
             logger.info('Start normalization of cols {}'.format(tag))
             columns = transform_params[tag].split(',')
-            df = FUNCTION_MAPPING[tag](df, columns, if_needed)
+            df = Standardization.columns_names(df, columns, if_needed)
 
     return df
 
 
+def select_raw_file(load_parameters: dict, file_path: str = "", src_time: str = "") -> str:
+    """
+    Selects the raw file to load: the given file_path, the most recent one or the closest one to src_time
+    :param load_parameters:
+    :param file_path:
+    :param src_time:
+    :return:
+    """
+    if len(file_path) > 0 and os.path.exists(file_path):
+        recent_file_raw = file_path
+
+    elif len(file_path) == 0:
+        if len(src_time) == 0:
+            recent_file_raw = DirectoryOperations.select_recent_file(load_parameters['path'],
+                                                                     load_parameters['file_name'])
+        else:
+            recent_file_raw = DirectoryOperations.select_close_file_by_date(
+                load_parameters['path'],
+                load_parameters['file_name'],
+                lim_date=src_time,
+                date_format=DATE_FORMAT_SOURCE,
+                structure='{0}_{0}_{1}'.format('{}', load_parameters['file_type']))
+
+    else:
+        raise AssertionError("{} does not exist".format(file_path))
+
+    return recent_file_raw
+
+
+def raw_input_path(source_setup: dict, file_path: str = "", src_time: str = "") -> str or None:
+    """
+    Raw file of the source, used on its fingerprint
+    :param source_setup:
+    :param file_path:
+    :param src_time:
+    :return: None for the sources read from queries
+    """
+    load_parameters = source_setup['raw_source']['load_parameters']
+    if 'quality' in source_setup['raw_source']['type'].keys():
+        raw_path = os.path.join(load_parameters['path'],
+                                load_parameters['file_name'] + '.' + load_parameters['file_type'])
+    elif source_setup['raw_source']['type']['specifics'] == 'file' and os.path.exists(load_parameters['path']):
+        raw_path = select_raw_file(load_parameters, file_path, src_time)
+    else:
+        return None
+    return raw_path if len(raw_path) > 0 and os.path.exists(raw_path) else None
+
+
+def save_fingerprint(to_save_parameters: dict, product: str, date_tag: str, date_part: str, raw_path: str,
+                     config_hash: str) -> None:
+    """
+    Saves the manifest with the fingerprint of the inputs alongside the output
+    :param to_save_parameters:
+    :param product:
+    :param date_tag:
+    :param date_part:
+    :param raw_path:
+    :param config_hash:
+    :return:
+    """
+    from ..processing.download import SaveData
+
+    output_path = SaveData.file_path(to_save_parameters['tag'], date_tag, to_save_parameters['path'], product,
+                                     to_save_parameters['file_type'], date_part)
+    SourceFingerprint.save(output_path, SourceFingerprint.build(raw_path, config_hash))
+
+
+def run_checkpoints(to_save_parameters: dict, product: str, src_tag: str, src_time: str, file_path: str,
+                    date_part: str, date_obj: datetime, raw_path: str or None, config_hash: str) -> 'StageCheckpoints':
+    """
+    Checkpoints of a run, on a hidden folder of the output folder of the source. The run is identified by the
+    parameters of app and its checkpoints are only valid with the same yaml, code and raw file (or day, for the
+    sources read from queries)
+    :param to_save_parameters:
+    :param product:
+    :param src_tag:
+    :param src_time:
+    :param file_path:
+    :param date_part:
+    :param date_obj:
+    :param raw_path:
+    :param config_hash:
+    :return:
+    """
+    from ..processing.checkpoints import StageCheckpoints
+
+    run_key = SourceFingerprint.config_hash({'src_tag': src_tag, 'src_time': src_time, 'file_path': file_path,
+                                             'date_part': date_part})[:20]
+    folder = os.path.join(to_save_parameters['path'], product, to_save_parameters['tag'], '.checkpoints', run_key)
+    fingerprint = {'config_hash': config_hash, 'code_version': SourceFingerprint.code_version()}
+    if raw_path is not None:
+        stat = os.stat(raw_path)
+        fingerprint['raw'] = [os.path.abspath(raw_path), stat.st_size, stat.st_mtime_ns]
+    else:
+        fingerprint['day'] = date_obj.strftime('%Y%m%d')
+    return StageCheckpoints(folder, fingerprint)
+
+
+def process_arrow_source(source_setup: dict, recent_file_raw: str, product: str, date_tag: str,
+                         date_part: str = "", save_type: str = 'file', test: bool = False) -> int:
+    """
+    Loads, standardizes and saves a csv source keeping the data in Arrow memory.
+    The data is only converted to pandas when the source needs to mask data.
+    :param source_setup:
+    :param recent_file_raw:
+    :param product:
+    :param date_tag:
+    :param date_part:
+    :param save_type:
+    :param test:
+    :return: number of rows of the source
+    """
+    # pyarrow is only needed by the sources on the arrow backend
+    import pandas as pd
+    from ..preparation.arrow_sources import ArrowStandardization
+    from ..preparation.compaction import Compaction
+    from ..preparation.sources import MaskData
+    from ..processing.upload import ReadFiles
+    from ..processing.download import SaveData
+
+    load_parameters = source_setup['raw_source']['load_parameters']
+    transform_params = source_setup['data_types']
+    to_save_parameters = source_setup['processed_source']['save_parameters']
+    assert load_parameters['file_type'] == 'csv', "The arrow backend is only available for csv files"
+
+    if 'change_col_names' in load_parameters.keys() and load_parameters['change_col_names'] == 'yes':
+        change_col_names = transform_params['names'].split(',')
+    else:
+        change_col_names = None
+
+    table = ReadFiles.arrow_data_file(recent_file_raw, load_parameters['header_row'], load_parameters['delimiter'],
+                                      load_parameters['encoding'], load_parameters['special_char'],
+                                      change_name_init_cols=change_col_names)
+    table = ArrowStandardization.remove_unnamed(table)
+
+    if 'optional' not in transform_params:
+        transform_params['optional'] = 0
+
+    # Start standardization, the tags only need the columns names
+    cols_source = [col.strip() for col in table.column_names]
+    table = table.rename_columns(cols_source)
+    transform_params = replace_data_types_tags(transform_params, pd.DataFrame(columns=cols_source))
+    check_cols_data_types(transform_params, cols_source)
+    if test and 'tests_params' in source_setup.keys():
+        tests_params = source_setup['tests_params']
+        if ('standardize_cols_names' in tests_params.keys()
+                and tests_params['standardize_cols_names'] is not None):
+            transform_params['standardize_cols_names'] = tests_params['standardize_cols_names']
+
+    table = ArrowStandardization.transform(table, transform_params)
+
+    dtypes = None
+    if 'mask_data' in source_setup.keys():
+        # Masking works on pandas
+        df = MaskData.cols(ArrowStandardization.to_pandas(table, transform_params), **source_setup['mask_data'])
+        if 'compact' in transform_params.keys():
+            df = Compaction.compact(df, transform_params)
+        df = transform(transform_params, 'names', df)
+        if 'compact' in transform_params.keys():
+            dtypes = Compaction.dtype_map(df)
+        table = None
+    else:
+        if 'compact' in transform_params.keys():
+            table = ArrowStandardization.compact(table, transform_params)
+        table_dtypes = ArrowStandardization.dtype_map(table, transform_params)
+        if 'standardize_cols_names' in transform_params.keys():
+            if_needed = transform_params['standardize_cols_names']
+        else:
+            if_needed = True
+        if 'names' in transform_params.keys() and transform_params['names'] is not None:
+            names = transform_params['names'].split(',')
+        else:
+            names = table.column_names
+        source_names = table.column_names
+        table = ArrowStandardization.columns_names(table, names, if_needed)
+        table_dtypes = {new: table_dtypes[old] for old, new in zip(source_names, table.column_names)
+                        if old in table_dtypes.keys()}
+        # The columnar files keep the dtypes of the pandas backend, the csv files on the dtype map
+        table = ArrowStandardization.with_pandas_metadata(table, table_dtypes)
+        if 'compact' in transform_params.keys():
+            dtypes = table_dtypes
+        df = None
+
+    if save_type == 'file':
+        logger.info('Saving file in {}'.format(to_save_parameters['path']))
+        save_params = dict(path=to_save_parameters['path'],
+                           product=product,
+                           tag=to_save_parameters['tag'],
+                           date_tag=date_tag,
+                           file_type=to_save_parameters['file_type'],
+                           delimiter=to_save_parameters['delimiter'],
+                           encoding=to_save_parameters['encoding'],
+                           date_part=date_part,
+                           dtypes=dtypes,
+                           **{x: to_save_parameters[x] for x in COLUMNAR_SAVE_PARAMS
+                              if x in to_save_parameters.keys()})
+        if table is not None:
+            SaveData.write_arrow_file(table, **save_params)
+        else:
+            SaveData.write_file(df, **save_params)
+
+    return table.num_rows if table is not None else len(df)
+
+
 def build_query_params(source_setup: dict, date_obj: datetime, src_tag: str, date_part: str = "",
                        test: bool = False) -> dict:
     """
@@ -285,6 +474,8 @@ def build_query_params(source_setup: dict, date_obj: datetime, src_tag: str, dat
     :param date_part:
     :return:
     """
+    from ..processing.aux_cache import AuxSourceCache
+    from ..processing.catalog import OutputCatalog
 
     try:
         assert type(source_setup) == dict, "The variable source_setup must be a dictionary"
@@ -316,13 +507,8 @@ def build_query_params(source_setup: dict, date_obj: datetime, src_tag: str, dat
                             )
                         else:
                             parent_folder = "."
-                        possible_path = os.path.join(parent_folder, 'temp_aux_sources')
-                        if not os.path.exists(possible_path):
-                            os.mkdir(possible_path)
-
-                        possible_path = os.path.join(possible_path, src_tag)
-                        if not os.path.exists(possible_path):
-                            os.mkdir(possible_path)
+                        # Auxiliary sources shared by every source, by version of the file and cols_needed
+                        aux_cache = AuxSourceCache(os.path.join(parent_folder, 'temp_aux_sources', 'cache'))
 
                         verify_source = [k for k in ['clean_source', 'prep_source']
                                          if k in temp_file_params.keys()]
@@ -358,32 +544,24 @@ def build_query_params(source_setup: dict, date_obj: datetime, src_tag: str, dat
                         aux_source_settings = aux_source_setup[src_setup]['save_parameters']
 
                         if 'product' in temp_file_params.keys():
-                            aux_source_file_path = DirectoryOperations.select_recent_file(
+                            aux_source_file_path = OutputCatalog.select_recent_file(
+                                aux_source_settings['path'],
                                 os.path.join(aux_source_settings['path'],
                                              temp_file_params['product'],
                                              aux_source_settings['tag']),
                                 aux_source_settings['tag'])
                         else:
-                            aux_source_file_path = DirectoryOperations.select_recent_file(
+                            aux_source_file_path = OutputCatalog.select_recent_file(
+                                aux_source_settings['path'],
                                 os.path.join(aux_source_settings['path'],
                                              temp_file_params['use_case'],
                                              temp_file_params['src_type'],
                                              aux_source_settings['tag']),
                                 aux_source_settings['tag'])
 
-                        aux_source = ReadFiles.data_file(aux_source_file_path, encoding='utf-8-sig', decimal='.')
-
-                        # Selected needed columns
-                        aux_source = aux_source[temp_file_params[
-                            'cols_needed'].split(",")].drop_duplicates()
-
-                        # Save as local file
-                        logger.info('Saving auxiliary source for temp_file_tag {}'.format(temp_file_tag))
-                        aux_source.to_csv(os.path.join(possible_path, "{}.csv".format(temp_file_tag)),
-                                          index=False, encoding='UTF-8-SIG', sep=',')
+                        # Selected needed columns, saved as local file
                         query_params[key]['insert_into'][temp_file_tag]['temp_file'] = os.path.abspath(
-                            os.path.join(possible_path,
-                                         "{}.csv".format(temp_file_tag)))
+                            aux_cache.get(aux_source_file_path, temp_file_params['cols_needed']))
         else:
             query_params = {}
         return query_params
@@ -394,9 +572,10 @@ def build_query_params(source_setup: dict, date_obj: datetime, src_tag: str, dat
 
 def app(src_tag: str, product: str = "master", src_time: str = "", user: str = '', password: str = '', env: str = 'dev',
         file_path: str = "", test: bool = False, data_folder_tests: str = r".\..\shyness\data\tests",
-        date_part: str = "") -> bool:
+        date_part: str = "", resume: bool = False) -> bool:
     """
     Function to process a source
+    :param resume: restarts from the last valid checkpoint of the run, see run_checkpoints
     :param file_path:
     :param data_folder_tests:
     :param test:
@@ -409,7 +588,34 @@ def app(src_tag: str, product: str = "master", src_time: str = "", user: str = '
     :param date_part:
     :return:
     """
+    return process_source(src_tag, product, src_time, user, password, env, file_path, test, data_folder_tests,
+                          date_part, resume)['successful']
+
+
+def process_source(src_tag: str, product: str = "master", src_time: str = "", user: str = '', password: str = '',
+                   env: str = 'dev', file_path: str = "", test: bool = False,
+                   data_folder_tests: str = r".\..\shyness\data\tests", date_part: str = "",
+                   resume: bool = False, source_setup: dict = None) -> dict:
+    """
+    Function to process a source, same as app with the summary of the run
+    :param resume:
+    :param source_setup: yaml of the source already read, e.g. by a backfill. It isn't changed
+    :param file_path:
+    :param data_folder_tests:
+    :param test:
+    :param src_tag:
+    :param src_time:
+    :param user:
+    :param password:
+    :param product:
+    :param env:
+    :param date_part:
+    :return: dict with successful, processed (False when there was an updated version), rows and error
+    """
     successful = False
+    not_processed = False
+    rows = 0
+    error = ''
     try:
         assert type(src_tag) == str, "The given src_tag must be a string"
         assert type(src_time) == str, "The given src_time must be a string"
@@ -437,7 +643,11 @@ def app(src_tag: str, product: str = "master", src_time: str = "", user: str = '
             package_name = 'shyness.params'
             package_name = '{}.{}'.format(package_name, product)
 
-            source_setup = read_yaml(src_tag, package_name)
+            if source_setup is None:
+                source_setup = read_yaml(src_tag, package_name)
+            else:
+                source_setup = copy.deepcopy(source_setup)
+            config_hash = SourceFingerprint.config_hash(source_setup)
             if ('multilevel' in source_setup['raw_source']['load_parameters']) and \
                     (source_setup['raw_source']['load_parameters']['multilevel']):
                 multilevel = True
@@ -446,6 +656,19 @@ def app(src_tag: str, product: str = "master", src_time: str = "", user: str = '
 
             source_setup = fix_yaml_columns(source_setup, multilevel)
 
+            # Several date_part's, e.g. 'MONTH,WEEK,DAY', are derived from one extraction, see DateParts
+            date_parts = [x.strip() for x in date_part.split(',') if len(x.strip()) > 0]
+            if len(date_parts) > 1:
+                from ..preparation.date_parts import DateParts
+                assert 'date_parts' in source_setup.keys(), \
+                    "The date_parts must be set on the yaml to process several date_part's"
+                date_parts_params = source_setup['date_parts']
+                DateParts.check_params(date_parts, date_parts_params)
+                query_date_part = date_parts_params['extract']
+            else:
+                date_parts_params = None
+                query_date_part = date_part
+
             # Check if there is a latency date
             if 'refresh_rate' in source_setup['conf_file'].keys():
                 refresh_rate_rfr = source_setup['conf_file']['refresh_rate'].split(',')
@@ -478,128 +701,195 @@ def app(src_tag: str, product: str = "master", src_time: str = "", user: str = '
                                                                        product,
                                                                        to_save_parameters['tag'],
                                                                        to_save_parameters['tag']) + '_', '')
-            if len(recent_file) > 0 and (len(src_time) == 0 and len(file_path) == 0):
+            raw_path = raw_input_path(source_setup, file_path, src_time)
+            if raw_path is not None and len(src_time) == 0 and len(file_path) == 0 and \
+                    SourceFingerprint.read(recent_file) is not None:
+                # The fingerprint of the inputs decides instead of the refresh_rate. A given file_path is always
+                # processed, as before the fingerprints
+                not_processed = not SourceFingerprint.matches(recent_file, raw_path, config_hash)
+                logger.info("Last Update: {}, inputs {}".format(file_date, 'changed' if not_processed else 'unchanged'))
+            elif len(recent_file) > 0 and (len(src_time) == 0 and len(file_path) == 0):
                 logger.info("Last Update: {} ".format(file_date))
                 file_date = datetime.strptime(file_date, DATE_FORMAT_SOURCE)
                 not_processed = compare_refresh_rate(file_date, date_obj, time_reference, rate)
             elif len(src_time) != 0 or len(file_path) == 0:
                 not_processed = True
-            if not_processed:
+            if not_processed and 'backend' in source_setup['data_types'].keys() and \
+                    source_setup['data_types']['backend'] == 'arrow':
+                logger.warning('No updated version of this source, loading source on the arrow backend')
+                load_parameters = source_setup['raw_source']['load_parameters']
+                assert source_setup['raw_source']['type']['specifics'] == 'file' and \
+                    'quality' not in source_setup['raw_source']['type'].keys(), \
+                    "The arrow backend is only available for files without quality corrections"
+                assert date_parts_params is None, "The arrow backend is only available for one date_part"
+                recent_file_raw = select_raw_file(load_parameters, file_path, src_time)
+                rows = process_arrow_source(source_setup, recent_file_raw, product, date_tag, date_part, save_type,
+                                            test)
+                if save_type == 'file':
+                    save_fingerprint(to_save_parameters, product, date_tag, date_part, recent_file_raw, config_hash)
+
+                logger.info("Source updated")
+                successful = True
+
+            elif not_processed:
                 logger.warning('No updated version of this source, loading source')
+                from ..preparation.sources import MaskData
+                from ..preparation.plan import StandardizationPlan, PARALLEL_PARAMS
+                from ..preparation.compaction import Compaction
+                from ..processing.data_quality import FileCorrections
+                from ..processing.upload import ReadFiles
+                from ..processing.download import SaveData
+
                 load_parameters = source_setup['raw_source']['load_parameters']
                 load_process = source_setup['raw_source']['type']['specifics']
                 transform_params = source_setup['data_types']
 
-                if 'quality' in source_setup['raw_source']['type'].keys():
-                    quality_params = source_setup['raw_source']['type']['quality']
-                    header = source_setup['data_types']['names'].replace("\n ", "")
-                    correction_mng = FileCorrections(quality_params, load_parameters, header)
-                    df = correction_mng.save_to_df()
-
-                elif load_process == 'file':
-                    if len(file_path) > 0 and os.path.exists(file_path):
-                        recent_file_raw = file_path
-
-                    elif len(file_path) == 0:
-                        if len(src_time) == 0:
-                            recent_file_raw = DirectoryOperations.select_recent_file(load_parameters['path'],
-                                                                                     load_parameters['file_name'])
+                checkpoints, stage = None, None
+                if resume or ('checkpoints' in source_setup['conf_file'].keys()
+                               and source_setup['conf_file']['checkpoints']):
+                    checkpoints = run_checkpoints(to_save_parameters, product, src_tag, src_time, file_path, date_part,
+                                                  date_obj, raw_path, config_hash)
+                if resume:
+                    stage, df, resumed_params = checkpoints.last()
+                    if stage is not None:
+                        transform_params = resumed_params
+
+                if stage is None:
+                    if 'quality' in source_setup['raw_source']['type'].keys():
+                        quality_params = source_setup['raw_source']['type']['quality']
+                        header = source_setup['data_types']['names'].replace("\n ", "")
+                        correction_mng = FileCorrections(quality_params, load_parameters, header)
+                        df = correction_mng.save_to_df()
+
+                    elif load_process == 'file':
+                        recent_file_raw = select_raw_file(load_parameters, file_path, src_time)
+                        if 'change_col_names' in load_parameters.keys() and \
+                                load_parameters['change_col_names'] == 'yes':
+                            change_col_names = transform_params['names'].split(',')
                         else:
-                            recent_file_raw = DirectoryOperations.select_close_file_by_date(
-                                load_parameters['path'],
-                                load_parameters['file_name'],
-                                lim_date=src_time,
-                                date_format=DATE_FORMAT_SOURCE,
-                                structure='{0}_{0}_{1}'.format('{}', load_parameters['file_type']))
+                            change_col_names = None
+
+                        if load_parameters['file_type'] == 'csv':
+
+                            df = ReadFiles.data_file(recent_file_raw, load_parameters['header_row'],
+                                                     load_parameters['delimiter'],
+                                                     load_parameters['encoding'], load_parameters['special_char'],
+                                                     load_parameters['decimal'],
+                                                     change_name_init_cols=change_col_names)
+                            df = ReadFiles.remove_unnamed(df)
+
+                        elif (load_parameters['file_type'] == 'xlsx') or (load_parameters['file_type'] == 'xls'):
+                            if multilevel:
+                                # multilevel = True
+                                df = ReadFiles.excel(path=recent_file_raw,
+                                                     sheet_number=load_parameters['sheet_number'],
+                                                     header_row=load_parameters['header_row'],
+                                                     multilevel=multilevel,
+                                                     macro_tags=transform_params['macro_tags_names'].split(','),
+                                                     micro_tags=transform_params['micro_tags_names'].split(','),
+                                                     duplicated_macro_tag=transform_params['duplicated_macro_tag'],
+                                                     change_name_init_cols=change_col_names
+                                                     )
+                            else:
+                                df = ReadFiles.excel(path=recent_file_raw,
+                                                     sheet_number=load_parameters['sheet_number'],
+                                                     header_row=load_parameters['header_row'],
+                                                     change_name_init_cols=change_col_names,
+                                                     decimal=load_parameters['decimal'])
+                        else:
+                            df = ReadFiles.excel(recent_file_raw, load_parameters['sheet_number'],
+                                                 load_parameters['header_row'],
+                                                 change_name_init_cols=change_col_names,
+                                                 decimal=load_parameters['decimal'])
+
+                        df = ReadFiles.remove_unnamed(df)
 
                     else:
-                        raise AssertionError("{} does not exist".format(file_path))
-                    if 'change_col_names' in load_parameters.keys() and load_parameters['change_col_names'] == 'yes':
-                        change_col_names = transform_params['names'].split(',')
+                        # Reading data sources from PDA
+                        assert user != '', 'Please provide a valid user'
+                        assert password != '', "Please provide a valid password"
+
+                        query_params = build_query_params(source_setup, date_obj, src_tag, query_date_part, test)
+                        logger.info("Start setup to run query")
+                        df = ReadFiles.table(load_parameters['query_file'],
+                                             transform_params['names'].split(','),
+                                             product, user, password, env, **query_params)
+                    if checkpoints is not None:
+                        checkpoints.save('load', df, transform_params)
+
+                if stage in [None, 'load']:
+                    if 'optional' not in transform_params:
+                        transform_params['optional'] = 0
+
+                    # Start standardization
+                    transform_params = replace_data_types_tags(transform_params, df)
+                    check_cols_data_types(transform_params, df.columns.tolist())
+                    if test:
+                        if 'tests_params' in source_setup.keys():
+                            tests_params = source_setup['tests_params']
+
+                            if ('standardize_cols_names' in tests_params.keys()
+                                    and tests_params['standardize_cols_names'] is not None):
+                                transform_params['standardize_cols_names'] = tests_params['standardize_cols_names']
+
+                    # Standardize every column and build the DataFrame once
+                    plan = StandardizationPlan(transform_params, df.columns.tolist())
+                    logger.info(plan.explain())
+                    if 'parallel' in transform_params.keys() and transform_params['parallel'] is not None:
+                        # e.g. parallel: {workers: 4, min_rows: 100000}
+                        parallel = transform_params['parallel']
+                        assert type(parallel) == dict and all(x in PARALLEL_PARAMS for x in parallel.keys()), \
+                            "The parallel parameter in data_types must be a dict with {}".format(PARALLEL_PARAMS)
+                        df = plan.execute(df, **parallel)
                     else:
-                        change_col_names = None
+                        df = plan.execute(df)
+                    plan.log_timings()
+                    if checkpoints is not None:
+                        checkpoints.save('standardization', df, transform_params)
 
-                    if load_parameters['file_type'] == 'csv':
+                if stage != 'masking' and 'mask_data' in source_setup.keys():
+                    mask_parameters = source_setup['mask_data']
 
-                        df = ReadFiles.data_file(recent_file_raw, load_parameters['header_row'],
-                                                 load_parameters['delimiter'],
-                                                 load_parameters['encoding'], load_parameters['special_char'],
-                                                 load_parameters['decimal'],
-                                                 change_name_init_cols=change_col_names)
-                        df = ReadFiles.remove_unnamed(df)
+                    df = MaskData.cols(df, **mask_parameters)
+                    if checkpoints is not None:
+                        checkpoints.save('masking', df, transform_params)
 
-                    elif (load_parameters['file_type'] == 'xlsx') or (load_parameters['file_type'] == 'xls'):
-                        if multilevel:
-                            # multilevel = True
-                            df = ReadFiles.excel(path=recent_file_raw,
-                                                 sheet_number=load_parameters['sheet_number'],
-                                                 header_row=load_parameters['header_row'],
-                                                 multilevel=multilevel,
-                                                 macro_tags=transform_params['macro_tags_names'].split(','),
-                                                 micro_tags=transform_params['micro_tags_names'].split(','),
-                                                 duplicated_macro_tag=transform_params['duplicated_macro_tag'],
-                                                 change_name_init_cols=change_col_names
-                                                 )
-                        else:
-                            df = ReadFiles.excel(path=recent_file_raw,
-                                                 sheet_number=load_parameters['sheet_number'],
-                                                 header_row=load_parameters['header_row'],
-                                                 change_name_init_cols=change_col_names,
-                                                 decimal=load_parameters['decimal'])
-                    else:
-                        df = ReadFiles.excel(recent_file_raw, load_parameters['sheet_number'],
-                                             load_parameters['header_row'],
-                                             change_name_init_cols=change_col_names, decimal=load_parameters['decimal'])
-
-                    df = ReadFiles.remove_unnamed(df)
+                if 'compact' in transform_params.keys():
+                    df = Compaction.compact(df, transform_params)
 
+                df = transform(transform_params, 'names', df)
+                rows = len(df)
+                if date_parts_params is not None:
+                    outputs = DateParts.derive_all(df, date_parts, date_parts_params)
                 else:
-                    # Reading data sources from PDA
-                    assert user != '', 'Please provide a valid user'
-                    assert password != '', "Please provide a valid password"
-
-                    query_params = build_query_params(source_setup, date_obj, src_tag, date_part, test)
-                    logger.info("Start setup to run query")
-                    df = ReadFiles.table(load_parameters['query_file'],
-                                         transform_params['names'].split(','),
-                                         product, user, password, env, **query_params)
-
-                if 'optional' not in transform_params:
-                    transform_params['optional'] = 0
-
-                # Start standardization
-                transform_params = replace_data_types_tags(transform_params, df)
-                check_cols_data_types(transform_params, df.columns.tolist())
-                if test:
-                    if 'tests_params' in source_setup.keys():
-                        tests_params = source_setup['tests_params']
-
-                        if ('standardize_cols_names' in tests_params.keys()
-                                and tests_params['standardize_cols_names'] is not None):
-                            transform_params['standardize_cols_names'] = tests_params['standardize_cols_names']
-
-                for tag in FUNCTION_MAPPING.keys():
-                    if tag == 'mask_data':
-                        if 'mask_data' in source_setup.keys():
-                            mask_parameters = source_setup['mask_data']
-
-                            df = MaskData.cols(df, **mask_parameters)
-                    else:
-                        df = transform(transform_params, tag, df)
+                    outputs = {date_part: df}
 
                 # Saving clean source
                 # TODO: CHECK
-                if save_type == 'file':
-                    logger.info('Saving file in {}'.format(to_save_parameters['path']))
-                    SaveData.write_file(df,
-                                        path=to_save_parameters['path'],
-                                        product=product,
-                                        tag=to_save_parameters['tag'],
-                                        date_tag=date_tag,
-                                        file_type=to_save_parameters['file_type'],
-                                        delimiter=to_save_parameters['delimiter'],
-                                        encoding=to_save_parameters['encoding'],
-                                        date_part=date_part)
+                for output_date_part, output_df in outputs.items():
+                    dtypes = None
+                    if 'compact' in transform_params.keys():
+                        dtypes = Compaction.dtype_map(output_df)
+                    if save_type == 'file':
+                        logger.info('Saving file in {}'.format(to_save_parameters['path']))
+                        SaveData.write_file(output_df,
+                                            path=to_save_parameters['path'],
+                                            product=product,
+                                            tag=to_save_parameters['tag'],
+                                            date_tag=date_tag,
+                                            file_type=to_save_parameters['file_type'],
+                                            delimiter=to_save_parameters['delimiter'],
+                                            encoding=to_save_parameters['encoding'],
+                                            date_part=output_date_part,
+                                            dtypes=dtypes,
+                                            **{x: to_save_parameters[x] for x in COLUMNAR_SAVE_PARAMS
+                                               if x in to_save_parameters.keys()})
+                        if raw_path is not None:
+                            save_fingerprint(to_save_parameters, product, date_tag, output_date_part, raw_path,
+                                             config_hash)
+
+                if checkpoints is not None:
+                    checkpoints.clean()
 
                 logger.info("Source updated")
                 successful = True
@@ -609,7 +899,10 @@ def app(src_tag: str, product: str = "master", src_time: str = "", user: str = '
 
         except ValueError as e:
             logger.error(e)
+            # A bare assert or raise has an empty message, the error can't be empty or the run is seen as updated
+            error = str(e) or repr(e)
     except AssertionError as e:
         logger.error(e)
+        error = str(e) or repr(e)
 
-    return successful
+    return {'successful': successful, 'processed': not_processed, 'rows': rows, 'error': error}
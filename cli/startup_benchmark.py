@@ -0,0 +1,148 @@
+"""
+Startup benchmark of the cli, each measure runs on a new interpreter so the imports are cold
+Usage: python -m <package>.cli.startup_benchmark [--runs 5] [--src_tag tag --product master]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Module timed by default, the entry point of the cli
+BENCHMARK_MODULE = 'cli.process_sources'
+
+# Modules that should only load on the code paths that need them
+HEAVY_MODULES = ['pandas', 'numpy', 'pyodbc', 'pyarrow', 'openpyxl', 'sqlalchemy']
+
+# Runs process_source on a new interpreter and prints the seconds, the summary and the heavy modules loaded
+SKIP_DECISION_CODE = """
+import json, sys, time
+start = time.perf_counter()
+from {package}.cli.process_sources import process_source
+summary = process_source({src_tag!r}, product={product!r}, env={env!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'summary': summary,
+                  'loaded': [x for x in {heavy!r} if x in sys.modules]}}, default=str))
+"""
+
+
+def package_name() -> str:
+    """
+    Name of the package of the cli, the folder of the repository can have any name
+    :return:
+    """
+    return __package__.rsplit('.', 1)[0]
+
+
+def interpreter_env() -> dict:
+    """
+    Environment of the interpreters, with the parent folder of the package on the PYTHONPATH
+    :return:
+    """
+    env = os.environ.copy()
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env['PYTHONPATH'] = os.pathsep.join([root] + [x for x in [env.get('PYTHONPATH', '')] if len(x) > 0])
+    return env
+
+
+def import_time(module: str) -> dict:
+    """
+    Cold import of a module with python -X importtime
+    :param module: full name of the module
+    :return: dict with the cumulative seconds of the module, the heavy modules loaded and the slowest packages imported
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                            env=interpreter_env(), capture_output=True, text=True)
+    assert result.returncode == 0, "The import of {} failed: {}".format(module, result.stderr.strip()[-500:])
+    # Lines as "import time:      self [us] |  cumulative | imported package", the nested imports are indented
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports[name.strip()] = int(cumulative) / 1e6
+    packages = [(k, v) for k, v in imports.items() if '.' not in k and k != module.split('.')[0]]
+    return {
+        'seconds': imports[module],
+        'loaded': [x for x in HEAVY_MODULES if x in imports.keys()],
+        'slowest': sorted(packages, key=lambda x: -x[1])[:5]
+    }
+
+
+def skip_decision_time(src_tag: str, product: str, env: str) -> dict:
+    """
+    Import of the cli and run of a source on a new interpreter. For a source with an updated version the run ends on
+    the refresh-rate or fingerprint check, so it times the decision to skip it. A source without one is processed
+    :param src_tag:
+    :param product:
+    :param env:
+    :return: dict with the seconds, the summary of the run and the heavy modules loaded
+    """
+    code = SKIP_DECISION_CODE.format(package=package_name(), src_tag=src_tag, product=product, env=env,
+                                     heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], env=interpreter_env(), capture_output=True, text=True)
+    assert result.returncode == 0, "The run of {} failed: {}".format(src_tag, result.stderr.strip()[-500:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark(runs: int = 5, module: str = BENCHMARK_MODULE, src_tag: str = '', product: str = 'master',
+              env: str = 'dev') -> dict:
+    """
+    Median of the cold import of a module and, with a src_tag, of the time to the skip decision of the source
+    :param runs: new interpreters of each measure
+    :param module: module relative to the package
+    :param src_tag: source to run, none by default
+    :param product:
+    :param env:
+    :return:
+    """
+    assert type(runs) == int and runs > 0, "The runs must be a positive int"
+    full_name = '{}.{}'.format(package_name(), module)
+    # The first run warms the disk cache of the files
+    import_time(full_name)
+    imports = [import_time(full_name) for _ in range(runs)]
+    summary = {
+        'module': full_name,
+        'import_seconds': statistics.median([x['seconds'] for x in imports]),
+        'loaded': imports[-1]['loaded'],
+        'slowest': imports[-1]['slowest']
+    }
+    if len(src_tag) > 0:
+        skips = [skip_decision_time(src_tag, product, env) for _ in range(runs)]
+        summary.update(src_tag=src_tag,
+                       skip_seconds=statistics.median([x['seconds'] for x in skips]),
+                       skip_processed=skips[-1]['summary']['processed'],
+                       skip_loaded=skips[-1]['loaded'])
+    return summary
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description='Startup benchmark of the cli, on new interpreters')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--module', default=BENCHMARK_MODULE, help='module relative to the package')
+    parser.add_argument('--src_tag', default='', help='source to time the decision to skip it')
+    parser.add_argument('--product', default='master')
+    parser.add_argument('--env', default='dev')
+    parser.add_argument('--json', action='store_true', help='prints the summary as json, e.g. to track it')
+    args = parser.parse_args(args)
+
+    start = time.perf_counter()
+    summary = benchmark(args.runs, args.module, args.src_tag, args.product, args.env)
+    if args.json:
+        print(json.dumps(summary))
+        return
+    print("import {}: {:.3f}s (median of {} runs)".format(summary['module'], summary['import_seconds'], args.runs))
+    print("heavy modules loaded: {}".format(', '.join(summary['loaded']) if len(summary['loaded']) > 0 else 'none'))
+    print("slowest imports: {}".format(', '.join('{} {:.3f}s'.format(*x) for x in summary['slowest'])))
+    if 'src_tag' in summary.keys():
+        print("skip decision of {}: {:.3f}s, {}, heavy modules loaded: {}".format(
+            summary['src_tag'], summary['skip_seconds'],
+            'processed' if summary['skip_processed'] else 'skipped',
+            ', '.join(summary['skip_loaded']) if len(summary['skip_loaded']) > 0 else 'none'))
+    print("benchmark in {:.1f}s".format(time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""
+Daemon that processes the sources of a product as soon as their raw files arrive
+Usage: python -m <package>.cli.watch_sources product [sources] [--interval 5] [--debounce 10] [--workers 2]
+"""
+import argparse
+import collections
+import importlib.util
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .batch_sources import select_sources
+from .process_sources import process_source
+from ..processing.sources_configuration_files import read_yaml
+from ..processing.workers import init_worker
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two scans of the folders
+WATCH_INTERVAL = 5
+
+# Seconds a file must be unchanged to be considered complete
+WATCH_DEBOUNCE = 10
+
+# Number of sources processed at the same time
+WATCH_WORKERS = 2
+
+# Times a file that failed is processed again, while it doesn't change
+WATCH_RETRIES = 2
+
+# Files being written by other tools
+PARTIAL_SUFFIXES = ('.tmp', '.part', '.crdownload', '.filepart')
+
+
+def run_file(src_tag: str, file_path: str, source_setup: dict, app_params: dict) -> dict:
+    """
+    Processes a source with a raw file that arrived. Module level function so it can run on a process pool
+    :param src_tag:
+    :param file_path: raw file, empty for the sources with quality corrections (fixed file)
+    :param source_setup:
+    :param app_params: parameters of process_source
+    :return: summary of the run
+    """
+    start = time.perf_counter()
+    try:
+        summary = process_source(src_tag, file_path=file_path, source_setup=source_setup, **app_params)
+    except Exception as e:
+        logger.exception(e)
+        summary = {'successful': False, 'processed': True, 'rows': 0, 'error': repr(e)}
+    summary.update(src_tag=src_tag, seconds=round(time.perf_counter() - start, 3))
+    return summary
+
+
+class SourceWatcher:
+    """
+    Watches the load_parameters path of the file sources of a product, scanning each folder once by interval.
+    A file matching the file_name and file_type of a source is processed when its size and modification time didn't
+    change for debounce seconds and it can be opened for reading. A file that failed is processed again after the
+    debounce, at most retries times, and again when it changes. The files of a source are processed by order of
+    arrival, one at a time, on a process pool that keeps the imports warm, and the database connections with
+    keep_connections.
+    The yaml of each source is read once and again only when the file of the yaml changes.
+    """
+
+    def __init__(self, product: str, sources='*', interval: float = WATCH_INTERVAL, debounce: float = WATCH_DEBOUNCE,
+                 process_existing: bool = False, retries: int = WATCH_RETRIES) -> None:
+        """
+        :param product:
+        :param sources: list of src_tag's or a glob over the yaml files of the product, see select_sources
+        :param interval: seconds between two scans
+        :param debounce: seconds a file must be unchanged
+        :param process_existing: processes the files already on the folders when the watch starts
+        :param retries: times a file that failed is processed again
+        """
+        assert type(product) == str, "The product must be a string"
+        assert interval > 0 and debounce >= 0, "The interval must be positive and the debounce not negative"
+        assert type(retries) == int and retries >= 0, "The retries must be a non negative int"
+        self._product = product
+        self._package_name = 'shyness.params.{}'.format(product)
+        self._src_tags = select_sources(product, sources)
+        self._interval = interval
+        self._debounce = debounce
+        self._retries = retries
+        self._setups = {}
+        # Signature (size, modification time) of each file: last seen, since when and already processed
+        self._seen = {}
+        self._processed = {}
+        # Failed runs of each file with its signature
+        self._failures = {}
+        self._queues = collections.defaultdict(collections.deque)
+        for src_tag in self._src_tags:
+            self.source_setup(src_tag)
+        if not process_existing:
+            for path, signature, _ in self.scan():
+                self._processed[path] = signature
+        logger.info("Watching {} sources of {} on {} folders".format(len(self._setups), product,
+                                                                     len(self.folders())))
+
+    def yaml_mtime(self, src_tag: str) -> int or None:
+        """
+        Modification time of the yaml of the source
+        :param src_tag:
+        :return: None when the file isn't found, e.g. a packaged yaml
+        """
+        try:
+            spec = importlib.util.find_spec(self._package_name)
+        except ModuleNotFoundError:
+            return None
+        if spec is None or spec.submodule_search_locations is None:
+            return None
+        for folder in spec.submodule_search_locations:
+            path = os.path.join(folder, '{}.yaml'.format(src_tag))
+            if os.path.exists(path):
+                return os.stat(path).st_mtime_ns
+        return None
+
+    def source_setup(self, src_tag: str) -> dict or None:
+        """
+        yaml of the source, read again when it changed
+        :param src_tag:
+        :return: None for the sources not read from files
+        """
+        mtime = self.yaml_mtime(src_tag)
+        if src_tag in self._setups.keys() and self._setups[src_tag][0] == mtime:
+            return self._setups[src_tag][1]
+        source_setup = read_yaml(src_tag, self._package_name)
+        assert len(source_setup) > 0, "The source {} doesn't have a yaml on {}".format(src_tag, self._package_name)
+        if source_setup['raw_source']['type']['specifics'] != 'file' and \
+                'quality' not in source_setup['raw_source']['type'].keys():
+            logger.info("{} isn't read from files, it isn't watched".format(src_tag))
+            source_setup = None
+        elif src_tag in self._setups.keys():
+            logger.info("The yaml of {} changed, reloaded".format(src_tag))
+        self._setups[src_tag] = (mtime, source_setup)
+        return source_setup
+
+    def folders(self) -> dict:
+        """
+        Sources of each watched folder
+        :return:
+        """
+        folders = collections.defaultdict(list)
+        for src_tag, (_, source_setup) in self._setups.items():
+            if source_setup is not None:
+                folders[os.path.abspath(source_setup['raw_source']['load_parameters']['path'])].append(src_tag)
+        return folders
+
+    def matches(self, src_tag: str, file_name: str) -> bool:
+        """
+        Checks if a file is a raw file of the source, as select_raw_file selects them
+        :param src_tag:
+        :param file_name:
+        :return:
+        """
+        source_setup = self._setups[src_tag][1]
+        load_parameters = source_setup['raw_source']['load_parameters']
+        if 'quality' in source_setup['raw_source']['type'].keys():
+            return file_name == '{}.{}'.format(load_parameters['file_name'], load_parameters['file_type'])
+        return file_name.startswith(load_parameters['file_name']) and \
+            file_name.lower().endswith('.{}'.format(load_parameters['file_type']).lower())
+
+    def scan(self) -> list:
+        """
+        Raw files on the watched folders, each folder listed once
+        :return: path, signature and src_tag of each file
+        """
+        files = []
+        for folder, src_tags in self.folders().items():
+            try:
+                entries = list(os.scandir(folder))
+            except OSError as e:
+                logger.warning(e)
+                continue
+            for entry in entries:
+                if entry.name.startswith('.') or entry.name.lower().endswith(PARTIAL_SUFFIXES):
+                    continue
+                for src_tag in src_tags:
+                    if self.matches(src_tag, entry.name):
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            # Removed after the listing
+                            continue
+                        if entry.is_file():
+                            files.append((entry.path, (stat.st_size, stat.st_mtime_ns), src_tag))
+        return files
+
+    @staticmethod
+    def readable(path: str) -> bool:
+        """
+        Checks if the file can be opened for reading, the writers that don't share the file lock it on Windows. The
+        raw folders can be read-only, the file isn't opened for writing
+        :param path:
+        :return:
+        """
+        try:
+            with open(path, 'rb'):
+                return True
+        except OSError:
+            return False
+
+    def failed(self, path: str) -> None:
+        """
+        Registers a failed run of a file, which is processed again after the debounce while it has retries left
+        :param path:
+        :return:
+        """
+        signature = self._processed.get(path)
+        key = (path, signature)
+        self._failures[key] = self._failures.get(key, 0) + 1
+        if self._failures[key] <= self._retries:
+            logger.warning("{} failed, retry {} of {}".format(path, self._failures[key], self._retries))
+            self._processed.pop(path, None)
+        else:
+            logger.error("{} failed {} times, it is only processed again when it changes".format(
+                path, self._failures[key]))
+
+    def poll(self) -> list:
+        """
+        Scans the folders and queues the complete files
+        :return: src_tag and path of the files queued
+        """
+        now = time.monotonic()
+        queued = []
+        current = set()
+        for path, signature, src_tag in self.scan():
+            current.add(path)
+            if self._processed.get(path) == signature:
+                continue
+            if path not in self._seen.keys() or self._seen[path][0] != signature:
+                self._seen[path] = (signature, now)
+                continue
+            if now - self._seen[path][1] < self._debounce or not self.readable(path):
+                continue
+            del self._seen[path]
+            self._processed[path] = signature
+            self._queues[src_tag].append(path)
+            queued.append((src_tag, path))
+            logger.info("New file {} of {}".format(path, src_tag))
+
+        # Files removed from the folders
+        for path in [x for x in list(self._seen.keys()) + list(self._processed.keys()) if x not in current]:
+            self._seen.pop(path, None)
+            self._processed.pop(path, None)
+        for key in [x for x in self._failures.keys() if x[0] not in current]:
+            del self._failures[key]
+        return queued
+
+    def run(self, workers: int = WATCH_WORKERS, keep_connections: bool = False, cycles: int = None,
+            **app_params) -> list:
+        """
+        Watches the folders until it is interrupted
+        :param workers: maximum number of sources processed at the same time
+        :param keep_connections: each process reuses its database connection
+        :param cycles: number of scans, None to run until interrupted
+        :param app_params: parameters of process_source, e.g. user, password, env
+        :return: summary of each run
+        """
+        assert type(workers) == int and workers > 0, "The workers must be a positive int"
+        app_params = dict(app_params, product=self._product)
+        summary = []
+        running = {}
+        cycle = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(keep_connections,)) as executor:
+            try:
+                while cycles is None or cycle < cycles or len(running) > 0:
+                    if cycles is None or cycle < cycles:
+                        self.poll()
+                        cycle += 1
+
+                    for future in [x for x in running.keys() if x.done()]:
+                        src_tag, path = running.pop(future)
+                        result = future.result()
+                        summary.append(result)
+                        # processed flags the sources that had to be processed, the others are skipped
+                        if not result['successful'] and (result['error'] != '' or result['processed']):
+                            self.failed(path)
+                        logger.info("{} {} in {:.1f}s".format(src_tag, 'ok' if result['successful'] else 'failed',
+                                                              result['seconds']))
+
+                    # One file of each source at a time, by order of arrival
+                    busy = set(x[0] for x in running.values())
+                    for src_tag, queue in self._queues.items():
+                        if len(queue) == 0 or src_tag in busy:
+                            continue
+                        source_setup = self.source_setup(src_tag)
+                        if source_setup is None:
+                            queue.clear()
+                            continue
+                        path = queue.popleft()
+                        file_path = '' if 'quality' in source_setup['raw_source']['type'].keys() else path
+                        running[executor.submit(run_file, src_tag, file_path, source_setup, app_params)] = \
+                            (src_tag, path)
+                    time.sleep(self._interval)
+            except KeyboardInterrupt:
+                logger.info("Watch interrupted, waiting for {} sources running".format(len(running)))
+        return summary
+
+
+def main(args=None) -> None:
+    parser = argparse.ArgumentParser(description='Processes the sources of a product as soon as their files arrive')
+    parser.add_argument('product')
+    parser.add_argument('sources', nargs='?', default='*', help="glob over the yaml files, e.g. 'sales_*'")
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL)
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE)
+    parser.add_argument('--workers', type=int, default=WATCH_WORKERS)
+    parser.add_argument('--process_existing', action='store_true')
+    parser.add_argument('--retries', type=int, default=WATCH_RETRIES)
+    parser.add_argument('--keep_connections', action='store_true',
+                        help='each process reuses its database connection')
+    parser.add_argument('--user', default='')
+    parser.add_argument('--password', default=os.environ.get('DATAPRO_PASSWORD', ''))
+    parser.add_argument('--env', default='dev')
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s -> %(name)s : %(levelname)s | %(message)s')
+
+    watcher = SourceWatcher(args.product, args.sources, args.interval, args.debounce, args.process_existing,
+                            args.retries)
+    watcher.run(args.workers, args.keep_connections, user=args.user, password=args.password, env=args.env)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""
+Standardization of sources kept in Arrow memory, with the pyarrow compute functions.
+The kernels follow the vectorised Standardization ones, with the regex on RE2 syntax: \\W is ASCII only on RE2, so
+the characters that are not letters, digits or underscores are [^\\p{L}\\p{N}_].
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from .compaction import CATEGORICAL_RATIO, INT_DTYPES
+from .plan import select_engine
+from .sources import Standardization
+from .time_handlers import format_signature
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT_SOURCE = "%Y%m%d_%H%M%S"
+
+NON_WORD_REGEX = r'[^\p{L}\p{N}_]'
+
+# pandas dtypes of the nullable columns, as the vectorised kernels of the pandas backend
+NULLABLE_TYPES = {
+    pa.int64(): pd.Int64Dtype(),
+    pa.float64(): pd.Float64Dtype()
+}
+
+
+class ArrowStandardization:
+    """
+    Standardization functions for pyarrow Tables
+    """
+
+    @staticmethod
+    def set_column(table: pa.Table, col: str, values: pa.Array) -> pa.Table:
+        """
+        Replaces a column of the table without copying the other ones
+        :param table:
+        :param col:
+        :param values:
+        :return:
+        """
+        return table.set_column(table.column_names.index(col), col, values)
+
+    @staticmethod
+    def as_strings(values: pa.ChunkedArray, fill: str) -> pa.ChunkedArray:
+        """
+        Casts the column to string and fills the nulls
+        :param values:
+        :param fill:
+        :return:
+        """
+        return pc.fill_null(pc.cast(values, pa.string()), fill)
+
+    @classmethod
+    def strings(cls, table: pa.Table, cols_to_consider: list, optional=0) -> pa.Table:
+        """
+        Same as Standardization.strings
+        :param table:
+        :param cols_to_consider:
+        :param optional:
+        :return:
+        """
+        assert type(cols_to_consider) == list, "The col_to_consider parameter is not a list."
+        cols_to_consider = Standardization.optional_col(optional, cols_to_consider, table.column_names)
+
+        for col in cols_to_consider:
+            values = cls.as_strings(table[col], '')
+            values = pc.utf8_lower(pc.replace_substring(values, ' ', ''))
+            values = pc.replace_substring(pc.replace_substring(values, 'nan', ''), 'none', '')
+            table = cls.set_column(table, col, pc.replace_substring_regex(values, NON_WORD_REGEX, ''))
+
+        return table
+
+    @classmethod
+    def nifs(cls, table: pa.Table, specific_cols: list, optional=0) -> pa.Table:
+        """
+        Same as Standardization.nifs
+        :param table:
+        :param specific_cols:
+        :param optional:
+        :return:
+        """
+        assert type(specific_cols) == list, "The specific_cols variable must be a list"
+        specific_cols = Standardization.optional_col(optional, specific_cols, table.column_names)
+
+        for col in specific_cols:
+            values = pc.utf8_lower(pc.utf8_trim_whitespace(cls.as_strings(table[col], '0')))
+            values = pc.replace_substring_regex(values, r'(?s)[.,].*', '')
+            values = pc.replace_substring_regex(values, NON_WORD_REGEX, '0')
+            table = cls.set_column(table, col, pc.replace_substring(values, 'nan', '0'))
+
+        return table
+
+    @classmethod
+    def ints(cls, table: pa.Table, specific_cols: list, optional=0, nullable: bool = False) -> pa.Table:
+        """
+        Same as Standardization.ints
+        :param table:
+        :param specific_cols:
+        :param optional:
+        :param nullable: the non-digits are null instead of 0
+        :return:
+        """
+        assert type(specific_cols) == list, "The specific_cols variable must be a list"
+        specific_cols = Standardization.optional_col(optional, specific_cols, table.column_names)
+
+        for col in specific_cols:
+            values = cls.as_strings(table[col], '')
+            values = pc.replace_substring(pc.replace_substring(values, ',', '.'), ' ', '')
+            values = pc.replace_substring(pc.replace_substring_regex(values, r'\.[^.]*$', ''), '.', '')
+            digits = pc.utf8_is_digit(values)
+            if nullable:
+                values = pc.cast(pc.if_else(digits, values, None), pa.int64())
+            else:
+                values = pc.cast(pc.if_else(digits, values, '0'), pa.int64())
+            table = cls.set_column(table, col, values)
+
+        return table
+
+    @classmethod
+    def floats(cls, table: pa.Table, specific_cols: list, optional=1, decimal=None,
+               nullable: bool = False) -> pa.Table:
+        """
+        Same as Standardization.parse_floats
+        :param table:
+        :param specific_cols:
+        :param optional:
+        :param decimal:
+        :param nullable: the empty values and the hours are null and the other values are kept, -1 included
+        :return:
+        """
+        assert type(specific_cols) == list, "The specific_cols variable must be a list"
+        specific_cols = Standardization.optional_col(optional, specific_cols, table.column_names)
+
+        for col in specific_cols:
+            values = pc.utf8_trim_whitespace(pc.cast(table[col], pa.string()))
+            missing = pc.or_(pc.is_null(values), pc.is_in(values, value_set=pa.array(['', '.'])))
+            values = pc.if_else(missing, '-1', values)
+
+            # Thousands separators, the decision is taken for the whole column
+            n_dots = pc.count_substring(values, '.')
+            n_commas = pc.count_substring(values, ',')
+            if pc.any(pc.greater(n_dots, 1)).as_py():
+                values = pc.replace_substring(values, '.', '')
+            elif pc.any(pc.equal(n_dots, 1)).as_py() and decimal == ",":
+                thousands = pc.match_substring_regex(values, r'^[^.]+\.[^.]{3}')
+                values = pc.if_else(thousands, pc.replace_substring(values, '.', ''), values)
+            elif pc.any(pc.greater(n_commas, 1)).as_py():
+                values = pc.replace_substring(values, ',', '')
+            elif pc.any(pc.equal(n_commas, 1)).as_py() and decimal == ".":
+                thousands = pc.match_substring_regex(values, r'^[^,]+,[^,]{3}')
+                values = pc.if_else(thousands, pc.replace_substring(values, ',', ''), values)
+            values = pc.replace_substring(values, '%', '')
+
+            # Classify the format of each value
+            n_dots = pc.count_substring(values, '.')
+            n_commas = pc.count_substring(values, ',')
+            many_dots = pc.greater(n_dots, 1)
+            decimal_comma = pc.and_(pc.equal(n_commas, 1), pc.equal(n_dots, 0))
+            mixed = pc.and_(pc.and_(pc.invert(many_dots), pc.greater(n_commas, 0)),
+                            pc.and_(pc.greater(pc.find_substring(values, '.'), 0),
+                                    pc.match_substring_regex(values, r',[^,]{2}$')))
+            hours = pc.and_(pc.greater(pc.find_substring(values, ':'), 0),
+                            pc.invert(pc.or_(pc.or_(many_dots, decimal_comma), mixed)))
+
+            without_dots = pc.replace_substring(values, '.', '')
+            mixed_values = pc.binary_join_element_wise(
+                pc.replace_substring(pc.utf8_slice_codeunits(without_dots, start=0, stop=-3), ',', ''),
+                pc.utf8_slice_codeunits(without_dots, start=-2), '.')
+            values = pc.if_else(hours, '-1', values)
+            values = pc.if_else(decimal_comma, pc.replace_substring(values, ',', '.'), values)
+            values = pc.if_else(mixed, mixed_values, values)
+            values = pc.if_else(many_dots, pc.replace_substring(without_dots, ',', '.'), values)
+
+            values = pc.cast(values, pa.float64())
+            if nullable:
+                values = pc.if_else(pc.or_(missing, hours), pa.scalar(None, pa.float64()), values)
+            else:
+                values = pc.if_else(pc.equal(values, -1), 0.0, values)
+            table = cls.set_column(table, col, values)
+
+        return table
+
+    @classmethod
+    def dates(cls, table: pa.Table, date_params: dict, optional=0) -> pa.Table:
+        """
+        Same as Standardization.parse_dates, the dates that are not valid raise a ValueError
+        :param table:
+        :param date_params:
+        :param optional:
+        :return:
+        """
+        assert type(date_params) == dict, "The date_params parameter is not a dict."
+        output_type = date_params['output_type'] if 'output_type' in date_params.keys() else 'str'
+        assert output_type in ['str', 'datetime'], "The output_type must be str or datetime"
+        cols_to_consider = date_params['cols'].split(",")
+        cols_to_consider = Standardization.optional_col(optional, cols_to_consider, table.column_names)
+
+        for col in cols_to_consider:
+            logger.info('start normalization for {}'.format(col))
+            values = cls.as_strings(table[col], '')
+            values = pc.if_else(pc.less(pc.utf8_length(values), 4), '', values)
+            to_parse = pc.invert(pc.is_in(values, value_set=pa.array(['', 'NaT'])))
+            format_to_use = Standardization.date_format(date_params, col)
+
+            if type(format_to_use) == list:
+                parsed = pa.nulls(len(values), pa.timestamp('s'))
+                for f in format_to_use:
+                    matched = pc.match_substring_regex(values, '^(?:{})$'.format(format_signature(f).pattern),
+                                                       ignore_case=True)
+                    parsed = pc.coalesce(parsed, pc.if_else(
+                        matched, pc.strptime(values, format=f, unit='s', error_is_null=True), None))
+            else:
+                text = values
+                if format_to_use[-1] == ".":
+                    text = pc.replace_substring_regex(values, r'(?s)\..*', '')
+                    format_to_use = format_to_use[:-1]
+                elif format_to_use[-1] == '0':
+                    text = pc.replace_substring_regex(values, r'(?s) .*', '')
+                    format_to_use = format_to_use[:-1]
+                parsed = pc.strptime(text, format=format_to_use, unit='s', error_is_null=True)
+
+            invalid = pc.filter(values, pc.and_(to_parse, pc.is_null(parsed)))
+            if len(invalid) > 0:
+                raise ValueError("The dates {} of {} don't match the format {}".format(
+                    invalid[:5].to_pylist(), col, format_to_use))
+
+            if output_type == 'datetime':
+                table = cls.set_column(table, col, parsed)
+            else:
+                formatted = pc.strftime(parsed, format=DATE_FORMAT_SOURCE)
+                table = cls.set_column(table, col, pc.if_else(to_parse, formatted, values))
+
+        return table
+
+    @staticmethod
+    def columns_names(table: pa.Table, new_columns_names: list, if_needed=True) -> pa.Table:
+        """
+        Same as Standardization.columns_names
+        :param table:
+        :param new_columns_names:
+        :param if_needed:
+        :return:
+        """
+        assert type(new_columns_names) == list, "The specific_cols variable must be a list"
+        if if_needed:
+            new_columns_names = [Standardization.normalize_column_name(x) for x in new_columns_names]
+        return table.rename_columns(new_columns_names)
+
+    @staticmethod
+    def remove_unnamed(table: pa.Table) -> pa.Table:
+        """
+        Same as ReadFiles.remove_unnamed
+        :param table:
+        :return:
+        """
+        return table.select([x for x in table.column_names if 'unnamed' not in x.lower()])
+
+    @classmethod
+    def transform(cls, table: pa.Table, transform_params: dict) -> pa.Table:
+        """
+        Runs all the data types standardization, by the same order of the pandas backend. The kernels are always the
+        vectorised ones, the nullable parameters are the same as the pandas backend (see plan.select_engine)
+        :param table:
+        :param transform_params:
+        :return:
+        """
+        optional = transform_params['optional'] if 'optional' in transform_params.keys() else 0
+        if 'engines' in transform_params.keys() and transform_params['engines'] is not None:
+            ignored = {k: v for k, v in transform_params['engines'].items() if v != 'vectorised'}
+            if len(ignored) > 0:
+                logger.warning("The arrow backend only runs the vectorised engine, the engines {} are ignored".format(
+                    ignored))
+        kernels = [('date_cols', cls.dates),
+                   ('float_cols', cls.floats),
+                   ('nif_cols', cls.nifs),
+                   ('str_cols', cls.strings),
+                   ('int_cols', cls.ints),
+                   ('n_client_cols', cls.ints)]
+        for tag, kernel in kernels:
+            if tag in transform_params.keys() and transform_params[tag] is not None:
+                logger.info("Star normalization of {}".format(tag))
+                params = {k: v for k, v in select_engine(transform_params, tag).items() if k == 'nullable'}
+                if tag == 'date_cols':
+                    table = kernel(table, transform_params[tag], optional, **params)
+                else:
+                    table = kernel(table, transform_params[tag].split(','), optional, **params)
+        return table
+
+    @classmethod
+    def compact(cls, table: pa.Table, transform_params: dict) -> pa.Table:
+        """
+        Same as Compaction.compact: the str_cols with few unique values are dictionary encoded, the int_cols and
+        n_client_cols are downcast and the float_cols are float32 when no value loses precision
+        :param table:
+        :param transform_params: data_types of the source, with the compact parameters
+        :return:
+        """
+        compact_params = transform_params['compact'] if transform_params['compact'] is not None else {}
+        assert type(compact_params) == dict, "The compact parameter in data_types must be a dict"
+        categorical_ratio = compact_params['categorical_ratio'] \
+            if 'categorical_ratio' in compact_params.keys() else CATEGORICAL_RATIO
+
+        for tag in ['str_cols', 'int_cols', 'n_client_cols', 'float_cols']:
+            if tag not in transform_params.keys() or transform_params[tag] is None:
+                continue
+            for col in [x for x in transform_params[tag].split(',') if x in table.column_names]:
+                values = table[col]
+                if len(values) == 0:
+                    continue
+                if tag == 'str_cols' and pa.types.is_string(values.type):
+                    if pc.count_distinct(values, mode='all').as_py() / len(values) <= categorical_ratio:
+                        table = cls.set_column(table, col, values.dictionary_encode())
+                elif pa.types.is_integer(values.type) and values.null_count < len(values):
+                    limits = pc.min_max(values)
+                    low, high = limits['min'].as_py(), limits['max'].as_py()
+                    for np_dtype in INT_DTYPES:
+                        if np.iinfo(np_dtype).min <= low and high <= np.iinfo(np_dtype).max:
+                            table = cls.set_column(table, col, pc.cast(values, pa.from_numpy_dtype(np_dtype)))
+                            break
+                elif pa.types.is_float64(values.type):
+                    compact = pc.cast(values, pa.float32(), safe=False)
+                    same = pc.fill_null(pc.equal(pc.cast(compact, pa.float64()), values), True)
+                    if pc.all(same).as_py():
+                        table = cls.set_column(table, col, compact)
+        return table
+
+    @staticmethod
+    def nullable_cols(transform_params: dict) -> list:
+        """
+        Columns of the data types with the nullable parameter, see plan.select_engine
+        :param transform_params:
+        :return:
+        """
+        return [col for tag in ['float_cols', 'int_cols', 'n_client_cols']
+                if tag in transform_params.keys() and transform_params[tag] is not None and
+                select_engine(transform_params, tag).get('nullable', False) for col in transform_params[tag].split(',')]
+
+    @classmethod
+    def to_pandas(cls, table: pa.Table, transform_params: dict) -> pd.DataFrame:
+        """
+        DataFrame of the table, with the nullable columns on the nullable dtypes of the pandas backend instead of
+        float64
+        :param table:
+        :param transform_params:
+        :return:
+        """
+        df = table.to_pandas()
+        nullable_cols = [x for x in cls.nullable_cols(transform_params) if x in table.column_names]
+        if len(nullable_cols) > 0:
+            nullable_df = table.select(nullable_cols).to_pandas(types_mapper=NULLABLE_TYPES.get)
+            for col in nullable_cols:
+                df[col] = nullable_df[col]
+        return df
+
+    @classmethod
+    def dtype_map(cls, table: pa.Table, transform_params: dict) -> dict:
+        """
+        Same as Compaction.dtype_map, with the pandas dtypes of the columns of the table
+        :param table:
+        :param transform_params: data_types of the source, with the nullable parameters
+        :return:
+        """
+        nullable_cols = cls.nullable_cols(transform_params)
+        dtypes = {}
+        for field in table.schema:
+            if pa.types.is_dictionary(field.type):
+                dtypes[field.name] = 'category'
+            elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+                dtype = field.type.to_pandas_dtype().__name__
+                dtypes[field.name] = dtype.capitalize() if field.name in nullable_cols else dtype
+            elif pa.types.is_timestamp(field.type):
+                dtypes[field.name] = 'datetime64[ns]'
+        return dtypes
+
+    @staticmethod
+    def with_pandas_metadata(table: pa.Table, dtypes: dict) -> pa.Table:
+        """
+        Sets the pandas metadata of the dtypes on the schema, so the columnar files are read with the same dtypes as
+        the ones saved by the pandas backend, e.g. Float32 instead of float32 with NaN
+        :param table:
+        :param dtypes: see dtype_map
+        :return:
+        """
+        empty = table.slice(0, 0).to_pandas()
+        for col, dtype in dtypes.items():
+            empty[col] = empty[col].astype(dtype)
+        return table.replace_schema_metadata(pa.Schema.from_pandas(empty, preserve_index=False).metadata)
@@ -0,0 +1,185 @@
+"""
+Compaction of the dtypes of the standardized sources, and the dtype map persisted alongside the output files
+"""
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Maximum ratio of unique values of a string column to convert it to categorical
+CATEGORICAL_RATIO = 0.5
+
+# Candidate dtypes of the downcast, smallest first
+INT_DTYPES = ['int8', 'int16', 'int32', 'int64']
+NULLABLE_INT_DTYPES = ['Int8', 'Int16', 'Int32', 'Int64']
+
+
+class Compaction:
+    """
+    Optional stage after the standardization, configured on the data_types of the source, e.g.:
+    compact:
+        categorical_ratio: 0.5
+        nullable: True
+    The nullable ints and floats are produced by the vectorised kernels, see plan.select_engine
+    """
+
+    @staticmethod
+    def memory_bytes(df: pd.DataFrame) -> int:
+        """
+        Bytes used by the DataFrame, with the python strings included
+        :param df:
+        :return:
+        """
+        return int(df.memory_usage(deep=True).sum())
+
+    @staticmethod
+    def categorical(values: pd.Series, categorical_ratio: float = CATEGORICAL_RATIO) -> pd.Series:
+        """
+        Converts a string column to categorical when it has few unique values
+        :param values:
+        :param categorical_ratio: maximum ratio of unique values
+        :return:
+        """
+        if len(values) == 0 or values.dtype != object:
+            return values
+        if values.nunique(dropna=False) / len(values) > categorical_ratio:
+            return values
+        return values.astype('category')
+
+    @staticmethod
+    def downcast_ints(values: pd.Series) -> pd.Series:
+        """
+        Smallest int dtype that holds every value of the column, nullable or not as the original one
+        :param values:
+        :return:
+        """
+        nullable = pd.api.types.is_extension_array_dtype(values.dtype)
+        if not pd.api.types.is_integer_dtype(values.dtype) or values.isna().all():
+            return values
+        low, high = values.min(), values.max()
+        for np_dtype, nullable_dtype in zip(INT_DTYPES, NULLABLE_INT_DTYPES):
+            limits = np.iinfo(np_dtype)
+            if limits.min <= low and high <= limits.max:
+                return values.astype(nullable_dtype if nullable else np_dtype)
+        return values
+
+    @staticmethod
+    def downcast_floats(values: pd.Series) -> pd.Series:
+        """
+        Converts a float column to 32 bits only when every value is kept exactly
+        :param values:
+        :return:
+        """
+        if not pd.api.types.is_float_dtype(values.dtype):
+            return values
+        nullable = pd.api.types.is_extension_array_dtype(values.dtype)
+        compact = values.astype('Float32' if nullable else 'float32')
+        same = (compact.astype(values.dtype) == values) | values.isna()
+        if not same.all():
+            return values
+        return compact
+
+    @classmethod
+    def compact(cls, df: pd.DataFrame, transform_params: dict) -> pd.DataFrame:
+        """
+        Compacts the standardized columns of the source:
+        - the str_cols with few unique values are categorical;
+        - the int_cols and n_client_cols are downcast to the smallest int that holds them;
+        - the float_cols are float32 when no value loses precision.
+        :param df:
+        :param transform_params: data_types of the source, with the compact parameters
+        :return:
+        """
+        assert type(df) == pd.DataFrame, "The df parameter must be a DataFrame"
+        compact_params = transform_params['compact'] if transform_params['compact'] is not None else {}
+        assert type(compact_params) == dict, "The compact parameter in data_types must be a dict"
+        categorical_ratio = compact_params['categorical_ratio'] \
+            if 'categorical_ratio' in compact_params.keys() else CATEGORICAL_RATIO
+
+        compactions = [('str_cols', lambda values: cls.categorical(values, categorical_ratio)),
+                       ('int_cols', cls.downcast_ints),
+                       ('n_client_cols', cls.downcast_ints),
+                       ('float_cols', cls.downcast_floats)]
+
+        bytes_before = cls.memory_bytes(df)
+        for tag, function in compactions:
+            if tag not in transform_params.keys() or transform_params[tag] is None:
+                continue
+            for col in transform_params[tag].split(','):
+                if col in df.columns:
+                    df[col] = function(df[col])
+        bytes_after = cls.memory_bytes(df)
+
+        logger.info("Compacted the source from {:.1f}MB to {:.1f}MB".format(bytes_before / 1024 ** 2,
+                                                                            bytes_after / 1024 ** 2))
+        return df
+
+    @staticmethod
+    def dtype_map(df: pd.DataFrame) -> dict:
+        """
+        Dtype of each column that is not read as the default by read_csv
+        :param df:
+        :return:
+        """
+        return {col: str(dtype) for col, dtype in df.dtypes.items() if dtype != object}
+
+    @staticmethod
+    def dtypes_path(file_path: str) -> str:
+        """
+        Path of the dtype map of a file. The file is hidden, so it isn't selected as a version of the source
+        :param file_path:
+        :return:
+        """
+        folder, file_name = os.path.split(file_path)
+        return os.path.join(folder, '.{}.dtypes.json'.format(file_name))
+
+    @classmethod
+    def save_dtypes(cls, file_path: str, dtypes: dict) -> None:
+        """
+        Saves the dtype map alongside the file
+        :param file_path:
+        :param dtypes:
+        :return:
+        """
+        assert type(dtypes) == dict, "The dtypes must be a dict"
+        with open(cls.dtypes_path(file_path), 'w') as file:
+            json.dump(dtypes, file, indent=4)
+
+    @classmethod
+    def read_dtypes(cls, file_path: str) -> dict or None:
+        """
+        Dtype map saved alongside the file
+        :param file_path:
+        :return: None when the file doesn't have one
+        """
+        path = cls.dtypes_path(file_path)
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            return json.load(file)
+
+    @staticmethod
+    def read_csv_dtypes(dtypes: dict) -> dict:
+        """
+        Dtypes that read_csv can build while parsing, the datetimes are restored after with restore
+        :param dtypes:
+        :return:
+        """
+        return {col: dtype for col, dtype in dtypes.items() if not dtype.startswith('datetime')}
+
+    @staticmethod
+    def restore(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+        """
+        Applies the dtype map to a loaded file
+        :param df:
+        :param dtypes:
+        :return:
+        """
+        dtypes = {col: dtype for col, dtype in dtypes.items() if col in df.columns and str(df[col].dtype) != dtype}
+        if len(dtypes) == 0:
+            return df
+        return df.astype(dtypes)
@@ -0,0 +1,135 @@
+"""
+Outputs of several date_part's (time_groups of the queries) derived from one extraction of the source
+"""
+import logging
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT_SOURCE = "%Y%m%d_%H%M%S"
+
+# date_part's of the queries, see QueryComponents.update_date_part
+VALID_DATE_PARTS = ['MONTH', 'WEEK', 'DAY', 'DOY']
+
+# date_part's with one row by date, every date_part can be derived from them
+DAILY_DATE_PARTS = ['DAY', 'DOY']
+
+# Aggregations that give the same result on the rows of a finer date_part
+VALID_AGGREGATIONS = ['sum', 'min', 'max']
+
+
+class DateParts:
+    """
+    Mode of the sources with time_groups to extract the finest date_part once, configured on the yaml, e.g.:
+    date_parts:
+        extract: DAY
+        date_col: dt_ref
+        part_col: period
+        aggregations: {amount: sum, n_clients: sum, max_balance: max}
+    The query runs with the extract date_part and must keep the date of the rows on date_col. The values of part_col
+    are computed from the date as the date_part of Netezza, and the rows are aggregated by the other columns.
+    The names of the columns are the ones of the output file
+    """
+
+    @staticmethod
+    def check_params(date_parts: list, date_parts_params: dict) -> None:
+        """
+        :param date_parts: date_part's of the outputs
+        :param date_parts_params: date_parts of the yaml
+        :return:
+        """
+        assert type(date_parts_params) == dict, "The date_parts of the yaml must be a dictionary"
+        for key in ['extract', 'date_col', 'part_col', 'aggregations']:
+            assert key in date_parts_params.keys(), "The {} is not set on the date_parts of the yaml".format(key)
+        extract = date_parts_params['extract']
+        assert extract in VALID_DATE_PARTS, "The extract date_part must be one of {}".format(VALID_DATE_PARTS)
+        assert len([x for x in date_parts if x not in VALID_DATE_PARTS]) == 0, \
+            "The date_part's must be in {}".format(VALID_DATE_PARTS)
+        # The weeks aren't inside months, only the daily date_part's can be aggregated into other ones
+        assert extract in DAILY_DATE_PARTS or date_parts == [extract], \
+            "The date_part's {} can't be derived from {}".format(date_parts, extract)
+        aggregations = date_parts_params['aggregations']
+        assert type(aggregations) == dict and len(aggregations) > 0, "The aggregations must be a non empty dictionary"
+        assert len([x for x in aggregations.values() if x not in VALID_AGGREGATIONS]) == 0, \
+            "The aggregations must be in {}".format(VALID_AGGREGATIONS)
+
+    @staticmethod
+    def parse_dates(dates: pd.Series) -> pd.Series:
+        """
+        Dates of the date_col as datetime64
+        :param dates:
+        :return:
+        """
+        if pd.api.types.is_datetime64_any_dtype(dates.dtype):
+            return dates
+        # The standardized dates are strings on the DATE_FORMAT_SOURCE, the other ones are inferred
+        parsed = pd.to_datetime(dates, format=DATE_FORMAT_SOURCE, errors='coerce')
+        other = parsed.isna() & dates.notna() & (dates != '')
+        if other.any():
+            parsed[other] = pd.to_datetime(dates[other], errors='coerce')
+        return parsed
+
+    @classmethod
+    def part_values(cls, dates: pd.Series, date_part: str) -> pd.Series:
+        """
+        date_part of each date
+        :param dates:
+        :param date_part:
+        :return:
+        """
+        dates = cls.parse_dates(dates)
+        if date_part == 'MONTH':
+            values = dates.dt.month
+        elif date_part == 'WEEK':
+            # ISO week, as date_part('WEEK', ...)
+            values = dates.dt.isocalendar().week
+        elif date_part == 'DAY':
+            values = dates.dt.day
+        else:
+            values = dates.dt.dayofyear
+        return values.astype('Int64')
+
+    @classmethod
+    def derive(cls, df: pd.DataFrame, date_part: str, date_parts_params: dict,
+               dates: pd.Series = None) -> pd.DataFrame:
+        """
+        Output of a date_part from the extraction
+        :param df: extraction with one row by date_col and the other columns
+        :param date_part:
+        :param date_parts_params:
+        :param dates: date_col already parsed, see parse_dates
+        :return: columns of df without the date_col, one row by part_col and the other columns
+        """
+        date_col = date_parts_params['date_col']
+        part_col = date_parts_params['part_col']
+        aggregations = date_parts_params['aggregations']
+        missing = [x for x in [date_col, part_col] + list(aggregations.keys()) if x not in df.columns]
+        assert len(missing) == 0, "The columns {} of the date_parts aren't on the source".format(missing)
+
+        cols = [x for x in df.columns if x != date_col]
+        keys = [x for x in cols if x not in aggregations.keys()]
+        derived = df[cols].copy()
+        derived[part_col] = cls.part_values(df[date_col] if dates is None else dates, date_part).values
+        derived = derived.groupby(keys, sort=False, dropna=False, observed=True).agg(aggregations).reset_index()
+        return derived[cols]
+
+    @classmethod
+    def derive_all(cls, df: pd.DataFrame, date_parts: list, date_parts_params: dict) -> dict:
+        """
+        Outputs of every date_part from one extraction
+        :param df:
+        :param date_parts:
+        :param date_parts_params:
+        :return: DataFrame of each date_part
+        """
+        cls.check_params(date_parts, date_parts_params)
+        outputs = {}
+        dates = cls.parse_dates(df[date_parts_params['date_col']])
+        for date_part in date_parts:
+            start = time.perf_counter()
+            outputs[date_part] = cls.derive(df, date_part, date_parts_params, dates)
+            logger.info("{} derived with {} rows from {} in {:.2f}s".format(date_part, len(outputs[date_part]),
+                                                                           len(df), time.perf_counter() - start))
+        return outputs
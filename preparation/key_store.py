@@ -0,0 +1,155 @@
+"""
+Indexed append-only store of the masked ids of MaskData, on an SQLite file
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Seconds a writer waits for the lock of the other writers
+LOCK_TIMEOUT = 600
+
+# Number of rows by insert, on the migration from the json files
+MIGRATION_CHUNK = 100000
+
+# Seconds between two checks of a migration running on another process
+MIGRATION_POLL = 1
+
+
+class KeyStore:
+    """
+    Masked id of each value, indexed by the value. The keys are only added, never changed, so parallel runs can
+    write on the same store: the first id written for a value is the one every run uses.
+    The stores are usually on a network share, so they use the rollback journal and not WAL, which needs shared
+    memory between the processes.
+    Usage:
+    with KeyStore(path) as store:
+        masked = store.masked_ids(values, MaskData.unique_id)
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Opens the store, creating it when it doesn't exist
+        :param path: path to the SQLite file
+        """
+        assert type(path) == str, "The path must be a string"
+        self._path = path
+        self._connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT, isolation_level=None)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS keys (value TEXT PRIMARY KEY, masked TEXT NOT NULL) "
+                                 "WITHOUT ROWID")
+        self._connection.execute("CREATE TEMP TABLE IF NOT EXISTS batch (value TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def lookup(self, values: list) -> dict:
+        """
+        Masked ids of a batch of values, with one query on a temporary table
+        :param values: values as strings
+        :return: masked id of the values present on the store
+        """
+        assert type(values) == list, "The values must be a list"
+        self._connection.execute("BEGIN")
+        try:
+            self._connection.execute("DELETE FROM batch")
+            self._connection.executemany("INSERT OR IGNORE INTO batch (value) VALUES (?)",
+                                         ((value,) for value in values))
+            masked = dict(self._connection.execute(
+                "SELECT keys.value, keys.masked FROM batch JOIN keys ON keys.value = batch.value"))
+            self._connection.execute("DELETE FROM batch")
+        finally:
+            self._connection.execute("COMMIT")
+        return masked
+
+    def insert(self, masked: dict) -> None:
+        """
+        Adds a batch of keys, the values already on the store keep their masked id
+        :param masked: masked id of each value
+        :return:
+        """
+        assert type(masked) == dict, "The masked must be a dict"
+        # Takes the write lock at the start, so the parallel writers wait instead of failing
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._connection.executemany("INSERT OR IGNORE INTO keys (value, masked) VALUES (?, ?)", masked.items())
+        except sqlite3.Error:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def masked_ids(self, values: list, new_id) -> dict:
+        """
+        Masked ids of a batch of values, creating the ones of the unseen values
+        :param values: values as strings
+        :param new_id: function that creates a new masked id
+        :return: masked id of every value
+        """
+        masked = self.lookup(values)
+        new = {}
+        for value in values:
+            if value not in masked and value not in new:
+                new[value] = new_id()
+        if len(new) > 0:
+            self.insert(new)
+            # Another run may have written some of the values meanwhile, its ids are the ones kept
+            masked.update(self.lookup(list(new.keys())))
+        logger.info("{} values masked, {} new keys".format(len(masked), len(new)))
+        return masked
+
+    @classmethod
+    def migrate_json(cls, json_path: str, path: str) -> None:
+        """
+        Creates a store with the keys of a json key file of MaskData, when the store doesn't exist.
+        The keys are copied to a temporary file that replaces the store only when it is complete, so the other runs
+        never use a store with part of the keys. One run migrates at a time, holding the {path}.migrating marker, and
+        the other ones wait for it and use its store
+        :param json_path: path to the json key file
+        :param path: path to the SQLite file
+        :return:
+        """
+        assert os.path.exists(json_path), "The json key file {} doesn't exist".format(json_path)
+        lock_path = '{}.migrating'.format(path)
+        start = time.monotonic()
+        while True:
+            try:
+                lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                assert time.monotonic() - start < LOCK_TIMEOUT, \
+                    "The migration of {} didn't finish, remove {} if it stopped".format(path, lock_path)
+                time.sleep(MIGRATION_POLL)
+
+        temp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+        try:
+            if os.path.exists(path):
+                # Migrated by another run meanwhile
+                return
+            logger.info("Migrating the keys of {} to {}".format(json_path, path))
+            with open(json_path) as json_file:
+                key_file = json.load(json_file)
+            assert type(key_file) == dict, "The json key file must have a dict"
+
+            items = list(key_file.items())
+            with cls(temp_path) as store:
+                for start in range(0, len(items), MIGRATION_CHUNK):
+                    store.insert(dict(items[start:start + MIGRATION_CHUNK]))
+                logger.info("{} keys on {}".format(len(store), path))
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            os.close(lock)
+            os.remove(lock_path)
@@ -0,0 +1,202 @@
+"""
+Compiled plan with the standardization of each column of a source
+"""
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from .sources import Standardization
+
+logger = logging.getLogger(__name__)
+
+# Kernel of each data type, by the order they run on a column
+KERNELS_MAPPING = {
+    'date_cols': Standardization.dates,
+    'float_cols': Standardization.floats,
+    'nif_cols': Standardization.nifs,
+    'str_cols': Standardization.strings,
+    'int_cols': Standardization.ints,
+    'n_client_cols': Standardization.ints
+}
+
+# Parameter of the data_types that turns on the nullable dtypes of each data type
+NULLABLE_MAPPING = {
+    'float_cols': 'nullable_floats',
+    'int_cols': 'nullable_ints',
+    'n_client_cols': 'nullable_ints'
+}
+
+# Minimum number of rows of the source to standardize the columns on a process pool
+PARALLEL_MIN_ROWS = 100000
+
+# Parameters of the parallel setting of the data_types, see StandardizationPlan.execute
+PARALLEL_PARAMS = ['workers', 'min_rows']
+
+
+def select_engine(transform_params: dict, tag: str) -> dict:
+    """
+    Engine chosen on the data_types of the source for the given tag, e.g.:
+    engines:
+        float_cols: vectorised
+        int_cols: vectorised
+    nullable_ints: True
+    nullable_floats: True
+    The nullable parameters default to the nullable of the compact stage, and a nullable data type without an
+    explicit engine runs on the vectorised one.
+    :param transform_params:
+    :param tag:
+    :return: dict with the engine parameters, empty when the source uses the legacy engine
+    """
+    engine = {}
+    if 'engines' in transform_params.keys() and transform_params['engines'] is not None:
+        assert type(transform_params['engines']) == dict, "The engines parameter in data_types must be a dict"
+        if tag in transform_params['engines'].keys():
+            engine['engine'] = transform_params['engines'][tag]
+
+    if tag in NULLABLE_MAPPING.keys():
+        nullable = None
+        if NULLABLE_MAPPING[tag] in transform_params.keys():
+            nullable = transform_params[NULLABLE_MAPPING[tag]]
+        elif 'compact' in transform_params.keys() and transform_params['compact'] is not None \
+                and 'nullable' in transform_params['compact'].keys():
+            nullable = transform_params['compact']['nullable']
+        if nullable is not None:
+            assert type(nullable) == bool, "The {} parameter in data_types must be a boolean".format(
+                NULLABLE_MAPPING[tag])
+            engine['nullable'] = nullable
+            if nullable and 'engine' not in engine.keys():
+                engine['engine'] = 'vectorised'
+    return engine
+
+
+def run_column_kernels(col: str, values: pd.Series, kernels: list, transform_params: dict, optional: int) -> tuple:
+    """
+    Runs the kernels of one column, by order. Module level function so it can run on a process pool
+    :param col: name of the column
+    :param values: column to standardize
+    :param kernels: list of (data type, engine) to run on the column
+    :param transform_params: data_types of the source
+    :param optional:
+    :return: standardized column and the seconds spent on each data type
+    """
+    timings = {}
+    # The Standardization functions work on DataFrames, the column is copied once into its own DataFrame and the
+    # kernels of the column run on it
+    col_df = pd.DataFrame({col: values})
+    for tag, engine in kernels:
+        start = time.perf_counter()
+        if tag == 'date_cols':
+            date_params = dict(transform_params[tag], cols=col)
+            col_df = KERNELS_MAPPING[tag](col_df, date_params, optional, **engine)
+        else:
+            col_df = KERNELS_MAPPING[tag](col_df, [col], optional, **engine)
+        timings[tag] = time.perf_counter() - start
+    return col_df[col], timings
+
+
+class StandardizationPlan:
+    """
+    Ordered list of kernels (column, data type, engine) compiled once from the resolved data_types.
+    The kernels run on each column apart and the standardized DataFrame is built once at the end.
+    """
+
+    def __init__(self, transform_params: dict, cols_source: list) -> None:
+        """
+        Compiles the plan
+        :param transform_params: data_types of the source, after replace_data_types_tags
+        :param cols_source: columns of the loaded source
+        """
+        assert type(transform_params) == dict, "The transform_params must be a dict"
+        assert type(cols_source) == list, "The cols_source must be a list"
+
+        self._transform_params = transform_params
+        self._optional = transform_params['optional'] if 'optional' in transform_params.keys() else 0
+        self._kernels = []
+        self._timings = {}
+
+        for tag in KERNELS_MAPPING.keys():
+            if tag not in transform_params.keys() or transform_params[tag] is None:
+                continue
+            if tag == 'date_cols':
+                cols = transform_params[tag]['cols'].split(",")
+            else:
+                cols = transform_params[tag].split(",")
+            engine = select_engine(transform_params, tag)
+
+            for col in cols:
+                if col not in cols_source:
+                    assert self._optional == 1, "The col {} is not present on the source".format(col)
+                    logger.warning("The col {} is not present on the source".format(col))
+                    continue
+                self._kernels.append((col, tag, engine))
+
+    @property
+    def kernels(self) -> list:
+        return self._kernels
+
+    @property
+    def timings(self) -> dict:
+        """
+        Seconds spent on each kernel of the last execution, by (column, data type)
+        :return:
+        """
+        return self._timings
+
+    def explain(self) -> str:
+        """
+        Description of which kernel runs on which column
+        :return:
+        """
+        lines = ['Standardization plan with {} kernels:'.format(len(self._kernels))]
+        for i, (col, tag, engine) in enumerate(self._kernels):
+            lines.append('{:>3}. {} <- {} ({})'.format(
+                i + 1, col, tag, ', '.join('{}={}'.format(k, v) for k, v in engine.items()) or 'engine=legacy'))
+        return '\n'.join(lines)
+
+    def execute(self, df: pd.DataFrame, workers: int = 1, min_rows: int = PARALLEL_MIN_ROWS) -> pd.DataFrame:
+        """
+        Runs the kernels and builds the standardized DataFrame.
+        With more than one worker and at least min_rows rows, each column is sent to a process pool and the results
+        are put back on the order of the columns
+        :param df:
+        :param workers: number of processes
+        :param min_rows: minimum number of rows to use the process pool
+        :return:
+        """
+        assert type(df) == pd.DataFrame, "The df parameter must be a DataFrame"
+        assert not df.columns.duplicated().any(), "The source has duplicated columns"
+        assert type(workers) == int and workers > 0, "The workers must be a positive int"
+        assert type(min_rows) == int and min_rows >= 0, "The min_rows must be a non negative int"
+
+        # The kernels of a column run in sequence, different columns are independent
+        kernels_by_col = {}
+        for col, tag, engine in self._kernels:
+            kernels_by_col.setdefault(col, []).append((tag, engine))
+
+        columns = {col: df[col] for col in df.columns}
+        self._timings = {}
+        if workers > 1 and len(df) >= min_rows and len(kernels_by_col) > 1:
+            logger.info("Standardizing {} columns on {} processes".format(len(kernels_by_col), workers))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {col: executor.submit(run_column_kernels, col, columns[col], kernels,
+                                                self._transform_params, self._optional)
+                           for col, kernels in kernels_by_col.items()}
+                for col, future in futures.items():
+                    columns[col], timings = future.result()
+                    self._timings.update({(col, tag): seconds for tag, seconds in timings.items()})
+        else:
+            for col, kernels in kernels_by_col.items():
+                columns[col], timings = run_column_kernels(col, columns[col], kernels, self._transform_params,
+                                                           self._optional)
+                self._timings.update({(col, tag): seconds for tag, seconds in timings.items()})
+
+        return pd.DataFrame(columns, index=df.index)
+
+    def log_timings(self) -> None:
+        """
+        Logs the time spent on each kernel of the last execution, slowest first
+        :return:
+        """
+        for (col, tag), seconds in sorted(self._timings.items(), key=lambda item: item[1], reverse=True):
+            logger.info("{} on {} took {:.3f}s".format(tag, col, seconds))
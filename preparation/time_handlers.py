@@ -2,12 +2,34 @@
 Scripts that recognizes time references
 """
 import logging
+import re
 from datetime import datetime
+from functools import lru_cache
 from dateutil import relativedelta
 
 logger = logging.getLogger(__name__)
 DATE_FORMAT_SOURCE = "%Y%m%d_%H%M%S"
 
+# Regex accepted by each strptime directive, the directives not mapped accept anything
+DIRECTIVES_SIGNATURE = {
+    'Y': r'\d{4}',
+    'y': r'\d{2}',
+    'm': r'\s?\d{1,2}',
+    'd': r'\s?\d{1,2}',
+    'H': r'\s?\d{1,2}',
+    'I': r'\s?\d{1,2}',
+    'M': r'\s?\d{1,2}',
+    'S': r'\s?\d{1,2}',
+    'j': r'\s?\d{1,3}',
+    'f': r'\d{1,6}',
+    'b': r'[^\W\d_]+',
+    'B': r'[^\W\d_]+',
+    'a': r'[^\W\d_]+',
+    'A': r'[^\W\d_]+',
+    'p': r'[^\W\d_]+',
+    '%': '%'
+}
+
 
 def compare_refresh_rate(old_date: datetime, new_date: datetime, time_reference: str, refresh_rate: int) -> bool:
     """
@@ -67,6 +89,29 @@ def select_validate_format(date_string: str, format_list: list) -> str:
         return ""
 
 
+@lru_cache(maxsize=None)
+def format_signature(date_format: str) -> re.Pattern:
+    """
+    Builds a regex that every date valid for the format matches, in order to classify the format of many dates
+    without trying strptime on each one
+    :param date_format: strptime format
+    :return: compiled regex to use with fullmatch
+    """
+    assert type(date_format) == str, "date_format must be a string"
+    signature = ''
+    i = 0
+    while i < len(date_format):
+        char = date_format[i]
+        if char == '%' and i + 1 < len(date_format):
+            signature += DIRECTIVES_SIGNATURE.get(date_format[i + 1], '.*?')
+            i += 2
+        else:
+            # strptime accepts any number of spaces where the format has one
+            signature += r'\s+' if char.isspace() else re.escape(char)
+            i += 1
+    return re.compile(signature, re.IGNORECASE)
+
+
 def map_date(date_object: datetime, ref: str) -> datetime:
     """
     Function that accordingly the team format and a reference will create a date_object
@@ -0,0 +1,120 @@
+"""
+Cache of the auxiliary sources of the queries (insert_into), shared by the sources and runs
+"""
+import hashlib
+import logging
+import os
+import time
+import uuid
+
+from ..processing.upload import ReadFiles
+
+logger = logging.getLogger(__name__)
+
+# Seconds without use after which an entry of the cache is removed
+CACHE_MAX_AGE = 7 * 24 * 3600
+
+# Seconds an entry of a previous version of the source is kept after its last use, longer than the queries of a run,
+# so a parallel worker that got it before the new version still finds it
+CACHE_GRACE_PERIOD = 24 * 3600
+
+
+class AuxSourceCache:
+    """
+    Projection of cols_needed of an auxiliary source, without duplicates, saved once by version of the source file.
+    The entries are named {source key}_{version key}.csv:
+    - the source key is the hash of the path of the file and of the cols_needed;
+    - the version key is the hash of the modification time and size of the file.
+    A new version of the file replaces the entries of the previous one once they weren't used for the grace period,
+    and the entries not used for max_age seconds are removed.
+    The entries are written to a temporary file and renamed, so parallel workers can share the same folder.
+    """
+
+    def __init__(self, folder: str, max_age: int = CACHE_MAX_AGE, grace_period: int = CACHE_GRACE_PERIOD) -> None:
+        """
+        :param folder: folder of the cache, created when it doesn't exist
+        :param max_age: seconds without use to remove an entry
+        :param grace_period: seconds without use to remove an entry of a previous version of the source
+        """
+        assert type(folder) == str, "The folder must be a string"
+        os.makedirs(folder, exist_ok=True)
+        self._folder = folder
+        self._max_age = max_age
+        self._grace_period = grace_period
+
+    @staticmethod
+    def key(values: list) -> str:
+        return hashlib.sha256('|'.join(str(x) for x in values).encode('utf8')).hexdigest()[:20]
+
+    def entry_path(self, source_path: str, cols_needed: str) -> tuple:
+        """
+        Path of the entry of the current version of the source
+        :param source_path:
+        :param cols_needed:
+        :return: source key and path of the entry
+        """
+        source_path = os.path.abspath(source_path)
+        stat = os.stat(source_path)
+        source_key = self.key([os.path.normcase(source_path), cols_needed])
+        version_key = self.key([stat.st_mtime_ns, stat.st_size])
+        return source_key, os.path.join(self._folder, '{}_{}.csv'.format(source_key, version_key))
+
+    def get(self, source_path: str, cols_needed: str) -> str:
+        """
+        Path of the auxiliary source with the cols_needed, building it when it isn't on the cache
+        :param source_path: path of the clean or prep source file
+        :param cols_needed: columns separated by commas
+        :return:
+        """
+        assert type(cols_needed) == str, "The cols_needed must be a string"
+        source_key, path = self.entry_path(source_path, cols_needed)
+        try:
+            # The modification time of the entry is its last use, the other workers don't remove it while it is used
+            os.utime(path)
+            logger.info('Auxiliary source {} found on the cache'.format(source_path))
+        except FileNotFoundError:
+            logger.info('Building the auxiliary source {} on the cache'.format(source_path))
+            if source_path.lower().endswith(('.parquet', '.feather')):
+                # Only the cols_needed are read from the columnar files
+                aux_source = ReadFiles.columnar_file(source_path, cols_needed.split(","))
+            else:
+                aux_source = ReadFiles.data_file(source_path, encoding='utf-8-sig', decimal='.')
+            aux_source = aux_source[cols_needed.split(",")].drop_duplicates()
+            temp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+            aux_source.to_csv(temp_path, index=False, encoding='UTF-8-SIG', sep=',')
+            try:
+                os.replace(temp_path, path)
+            except PermissionError:
+                # On the Windows shares the entry can't be replaced while another worker that built it has it open,
+                # the same columns of the same version were saved on it so that entry is used
+                os.remove(temp_path)
+                if not os.path.exists(path):
+                    raise
+                logger.info('Auxiliary source {} built by another worker, using its entry'.format(source_path))
+
+        self.clean(source_key, path)
+        return path
+
+    def clean(self, source_key: str = None, current_path: str = None) -> None:
+        """
+        Removes the entries of older versions of the source not used for the grace period and the entries not used
+        for max_age seconds
+        :param source_key: key of the source just used
+        :param current_path: entry of the current version of that source
+        :return:
+        """
+        now = time.time()
+        for file_name in os.listdir(self._folder):
+            path = os.path.join(self._folder, file_name)
+            if path == current_path:
+                continue
+            try:
+                superseded = source_key is not None and file_name.startswith(source_key + '_') \
+                    and file_name.endswith('.csv')
+                unused = now - os.path.getmtime(path)
+                if (superseded and unused > self._grace_period) or unused > self._max_age:
+                    os.remove(path)
+                    logger.info('Removed {} from the auxiliary sources cache'.format(file_name))
+            except OSError as e:
+                # The file is being used or was removed by another worker
+                logger.warning(e)
@@ -0,0 +1,160 @@
+"""
+Catalog of the output files written by SaveData, on an SQLite file on the root folder of the outputs
+"""
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Name of the catalog on the root folder, hidden so it isn't selected as a source
+CATALOG_NAME = '.catalog.sqlite'
+
+# Seconds a reader waits for the lock of the writers
+LOCK_TIMEOUT = 600
+
+# Seconds a writer waits for the lock of the other writers, the output is already written and is found by listing
+# the folder while the name doesn't have outputs registered
+REGISTER_TIMEOUT = 30
+
+
+class OutputCatalog:
+    """
+    Outputs of a root folder (the path of the save_parameters), registered when they are written: folder (relative to
+    the root), name (tag or tag_{date_part}), date_tag, tag, product, date_part, rows, bytes, schema (dtype of each
+    column) and content hash, when the writer has it.
+    The most recent output of a name is found with one indexed query and the stat of that file. The folder is only
+    listed for the names without outputs registered (e.g. written before the catalog), see select_recent_file.
+    The root folder is usually a network share, so the catalog uses the rollback journal and not WAL, which needs
+    shared memory between the processes.
+    Usage:
+    with OutputCatalog(path) as catalog:
+        file_path = catalog.recent_file(folder, tag)
+    """
+
+    def __init__(self, root: str, create: bool = True, timeout: float = LOCK_TIMEOUT) -> None:
+        """
+        :param root: root folder of the outputs
+        :param create: creates the catalog when it doesn't exist, the readers don't
+        :param timeout: seconds waiting for the lock of the other connections
+        """
+        assert type(root) == str, "The root must be a string"
+        self._root = root
+        self._path = os.path.join(root, CATALOG_NAME)
+        self._connection = None
+        if not create and not os.path.exists(self._path):
+            return
+        self._connection = sqlite3.connect(self._path, timeout=timeout, isolation_level=None)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS outputs (folder TEXT NOT NULL, file_name TEXT NOT NULL, "
+                                 "name TEXT NOT NULL, date_tag TEXT NOT NULL, tag TEXT NOT NULL, product TEXT, "
+                                 "date_part TEXT, rows INTEGER, bytes INTEGER, schema TEXT, content_hash TEXT, "
+                                 "registered TEXT, PRIMARY KEY (folder, file_name)) WITHOUT ROWID")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS outputs_name ON outputs (folder, name, date_tag)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+
+    def relative_folder(self, folder: str) -> str:
+        """
+        Folder relative to the root, with the same separators on every system
+        :param folder:
+        :return:
+        """
+        return os.path.relpath(folder, self._root).replace('\\', '/')
+
+    @staticmethod
+    def size(file_path: str) -> int:
+        """
+        Bytes of an output, the files of the partitioned outputs (folders) summed
+        :param file_path:
+        :return:
+        """
+        if not os.path.isdir(file_path):
+            return os.path.getsize(file_path)
+        return sum(os.path.getsize(os.path.join(folder, x)) for folder, _, files in os.walk(file_path) for x in files)
+
+    def register(self, file_path: str, tag: str, product: str, date_tag: str, date_part: str = '', rows: int = None,
+                 schema: dict = None, content_hash: str = None) -> None:
+        """
+        Registers an output, replacing the entry of the same file
+        :param file_path: path of the output, inside the root
+        :param tag:
+        :param product:
+        :param date_tag:
+        :param date_part:
+        :param rows:
+        :param schema: dtype of each column
+        :param content_hash:
+        :return:
+        """
+        folder, file_name = os.path.split(file_path)
+        name = tag if date_part == '' else '{}_{}'.format(tag, date_part)
+        entry = (self.relative_folder(folder), file_name, name, date_tag, tag, product, date_part, rows,
+                 self.size(file_path), json.dumps(schema) if schema is not None else None, content_hash,
+                 datetime.now().strftime("%Y%m%d_%H%M%S"))
+        # Takes the write lock at the start, so the parallel writers wait instead of failing
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._connection.execute("INSERT OR REPLACE INTO outputs (folder, file_name, name, date_tag, tag, product, "
+                                     "date_part, rows, bytes, schema, content_hash, registered) "
+                                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", entry)
+        except sqlite3.Error:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def recent_file(self, folder: str, name: str, date_file: str = '') -> str:
+        """
+        Most recent output of a name on a folder
+        :param folder:
+        :param name: tag or tag_{date_part}
+        :param date_file: only the outputs of a day, YYYYMMDD
+        :return: empty when the name doesn't have outputs registered
+        """
+        if self._connection is None:
+            return ''
+        # The removed files are skipped, usually only the first one is checked
+        rows = self._connection.execute(
+            "SELECT file_name FROM outputs WHERE folder = ? AND name = ? AND date_tag LIKE ? "
+            "ORDER BY date_tag DESC, file_name DESC", (self.relative_folder(folder), name, date_file + '%'))
+        for row in rows:
+            path = os.path.join(folder, row[0])
+            if os.path.exists(path):
+                return path
+        return ''
+
+    @classmethod
+    def select_recent_file(cls, root: str, folder: str, name: str, date_file: str = '') -> str:
+        """
+        Most recent output of a name, from the catalog of the root, listing the folder when the catalog doesn't have
+        an output of the name that still exists
+        :param root: root folder of the outputs
+        :param folder: folder of the outputs, inside the root
+        :param name: tag or tag_{date_part}
+        :param date_file: only the outputs of a day, YYYYMMDD
+        :return:
+        """
+        # The DirectoryOperations are only needed for the outputs not registered
+        from ..processing.workspace import DirectoryOperations
+
+        path = ''
+        try:
+            with cls(root, create=False) as catalog:
+                path = catalog.recent_file(folder, name, date_file)
+        except sqlite3.Error as e:
+            logger.warning("Catalog of {} not available: {}".format(root, e))
+            path = ''
+        if len(path) > 0:
+            return path
+        if date_file != '':
+            return DirectoryOperations.select_file_by_date(folder, name, date_file)
+        return DirectoryOperations.select_recent_file(folder, name)
@@ -0,0 +1,91 @@
+"""
+Checkpoints of the stages of a source (load, standardization and masking), to resume a failed run
+"""
+import json
+import logging
+import os
+import pickle
+import shutil
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Stages with checkpoint, by order
+STAGES = ['load', 'standardization', 'masking']
+
+
+class StageCheckpoints:
+    """
+    DataFrame and data_types after each stage of a run, saved on the run folder:
+    - {stage}.pkl with the DataFrame. A resumed run must go on with the same values as the run that stopped, and
+    parquet doesn't keep them on the object columns (nan is read as None, the mixed types are refused), so the
+    DataFrame is pickled;
+    - {stage}.json with the fingerprint of the run and the data_types resolved until the stage.
+    A checkpoint is only valid for a run with the same fingerprint.
+    """
+
+    def __init__(self, folder: str, fingerprint: dict) -> None:
+        """
+        :param folder: run folder
+        :param fingerprint: config and inputs of the run, e.g. hash of the yaml, code version and raw file
+        """
+        assert type(folder) == str, "The folder must be a string"
+        assert type(fingerprint) == dict, "The fingerprint must be a dict"
+        self._folder = folder
+        self._fingerprint = fingerprint
+
+    @property
+    def folder(self) -> str:
+        return self._folder
+
+    def save(self, stage: str, df: pd.DataFrame, transform_params: dict) -> None:
+        """
+        Saves the checkpoint of a stage
+        :param stage:
+        :param df:
+        :param transform_params: data_types after the stage
+        :return:
+        """
+        assert stage in STAGES, "The stage must be one of {}".format(STAGES)
+        os.makedirs(self._folder, exist_ok=True)
+        data_path = os.path.join(self._folder, stage)
+        with open(data_path + '.pkl', 'wb') as file:
+            pickle.dump(df, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # The metadata is written last, a checkpoint without it isn't valid
+        with open(data_path + '.json', 'w') as file:
+            json.dump({'stage': stage, 'format': 'pkl', 'fingerprint': self._fingerprint,
+                       'transform_params': transform_params}, file, indent=4, default=str)
+        logger.info("Checkpoint after {} saved on {}".format(stage, self._folder))
+
+    def last(self) -> tuple:
+        """
+        Last valid checkpoint of the run
+        :return: stage, DataFrame and data_types, or (None, None, None) when there is none
+        """
+        for stage in reversed(STAGES):
+            data_path = os.path.join(self._folder, stage)
+            if not os.path.exists(data_path + '.json'):
+                continue
+            with open(data_path + '.json') as file:
+                meta = json.load(file)
+            if meta['fingerprint'] != self._fingerprint:
+                logger.warning("Checkpoint after {} ignored, it has a different fingerprint".format(stage))
+                continue
+            with open(data_path + '.pkl', 'rb') as file:
+                df = pickle.load(file)
+            logger.info("Resuming after {} from {}".format(stage, self._folder))
+            return stage, df, meta['transform_params']
+        return None, None, None
+
+    def clean(self) -> None:
+        """
+        Removes the checkpoints of the run
+        :return:
+        """
+        # Only the run folder is removed, the hidden folder of the checkpoints is shared with the runs on parallel
+        # (e.g. a backfill) and removing it could fail the checkpoints they are creating
+        if os.path.exists(self._folder):
+            shutil.rmtree(self._folder, ignore_errors=True)
+            logger.info("Checkpoints removed from {}".format(self._folder))
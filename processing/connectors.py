@@ -2,6 +2,7 @@
 Module with classes/object that handles the connection with the database, and also executes the queries
 """
 import logging
+import re
 
 import pandas as pd
 import pyodbc
@@ -10,6 +11,10 @@ from ..processing.query_factory import *
 
 logger = logging.getLogger(__name__)
 
+# Temporary tables created by the queries, they stay on the session until they are dropped or it is closed
+TEMP_TABLE_REGEX = re.compile(r'create\s+(?:temp|temporary)\s+table\s+(?:if\s+not\s+exists\s+)?([\w."]+)',
+                              re.IGNORECASE)
+
 
 class NetezzaConn:
     """
@@ -32,6 +37,7 @@ class NetezzaConn:
         self._connector = None
         self._port = '5480'
         self._env = env
+        self._temp_tables = []
 
     # Getter and Setter for the objects
     @property
@@ -137,6 +143,9 @@ class NetezzaConn:
 
         # Check if is many query
         queries = query_to_execute.split(";")
+        for table in TEMP_TABLE_REGEX.findall(query_to_execute):
+            if table not in self._temp_tables:
+                self._temp_tables.append(table)
         try:
             if len(queries) > 1:
                 if len(queries[-1]) < 2:
@@ -166,6 +175,35 @@ class NetezzaConn:
 
         return result
 
+    def drop_temp_tables(self) -> None:
+        """
+        Drops the temporary tables created by the queries of the connection, so the next queries on the same session
+        can create them again
+        :return:
+        """
+        cursor = self._connector.cursor()
+        for table in reversed(self._temp_tables):
+            try:
+                cursor.execute("DROP TABLE {};".format(table))
+            except pyodbc.Error as e:
+                # Already dropped by the query
+                logger.info(e)
+        cursor.close()
+        self._temp_tables = []
+
+    def close(self) -> None:
+        """
+        Closes the connection, the temporary tables are dropped with the session
+        :return:
+        """
+        if self._connector is not None:
+            try:
+                self._connector.close()
+            except pyodbc.Error as e:
+                logger.warning(e)
+            self._connector = None
+        self._temp_tables = []
+
     def select_simple_query(self, query_to_execute):
         """
         Executes select query
@@ -91,6 +91,45 @@ class CorrectionFunctions:
         return email_bites
 
 
+class EntityContacts:
+    """
+    Ordered set of contacts for each entity.
+    The contacts are stored as dict keys, so the insertion order is kept and the membership test is O(1)
+    """
+
+    def __init__(self) -> None:
+        self._contacts = {}
+
+    def has(self, entity_id: str, contact: str) -> bool:
+        """
+        Check if the contact is already stored for the entity
+        :param entity_id:
+        :param contact:
+        :return:
+        """
+        return entity_id in self._contacts and contact in self._contacts[entity_id]
+
+    def add(self, entity_id: str, contact: str) -> bool:
+        """
+        Store a contact for the entity
+        :param entity_id:
+        :param contact:
+        :return: True if the contact was not stored before
+        """
+        contacts = self._contacts.setdefault(entity_id, {})
+        if contact in contacts:
+            return False
+        contacts[contact] = None
+        return True
+
+    def counts(self) -> dict:
+        """
+        Number of contacts stored for each entity
+        :return:
+        """
+        return {entity_id: len(contacts) for entity_id, contacts in self._contacts.items()}
+
+
 class FileCorrections:
     """
     Object that contains functions to correct files
@@ -110,6 +149,11 @@ class FileCorrections:
         self._name_position = None
         self._content_after_name = None
 
+        # Contacts found for each entity on each correction
+        self._contacts_by_columns = EntityContacts()
+        self._contacts_phone_number = EntityContacts()
+        self._contacts_email = EntityContacts()
+
         # Get variables from environment
         self._parent_folder = load_params['path']
         self._file_name = load_params['file_name'] + '.' + load_params['file_type']
@@ -147,6 +191,16 @@ class FileCorrections:
         assert new_type_source in ['DOCUMENTS', 'CONTRACTS', 'SUPPLIERS'], "The new_type_source is not a valid tag"
         self._type_source = new_type_source
 
+    @property
+    def contacts_report(self) -> dict:
+        """
+        Number of contacts by entity found on each correction
+        :return:
+        """
+        return {'number_of_columns_by_contacts': self._contacts_by_columns.counts(),
+                'phone_number': self._contacts_phone_number.counts(),
+                'email': self._contacts_email.counts()}
+
     def adjust_delimiters(self):
         """
         Detects delimiters as characters and detect row with a wrong numbers of columns
@@ -190,19 +244,17 @@ class FileCorrections:
         # Copy lines of the document
         logger.info("Correction of number of columns has started")
 
-        # Init dictionary to storage contacts for each entity with errors
-        dict_error = {}
+        # Contacts already present for each entity with errors
+        contacts_present = self._contacts_by_columns
         for index in range(1, len(self._corrected_lines)):
             list_lines = self._corrected_lines[index].split(self._delimiter)
 
             # Check if the number of elements of the current line is the same as the header
             make_the_difference = len(list_lines) - len(self._header_cols)
             if make_the_difference > 0:
-                # if the line has more columns than the header, stores the entity as key on the dict
+                # if the line has more columns than the header, stores the entity
                 entity_id = list_lines[self._id_position]
-                if entity_id not in dict_error.keys():
-                    dict_error[entity_id] = {'present': [],
-                                             'not_present': []}
+                not_present = []
 
                 # Start cycle to eliminate the number of columns that exceeded
                 for i in range(make_the_difference):
@@ -211,27 +263,26 @@ class FileCorrections:
                         list_lines[self._email_position] = list_lines[
                             self._email_position].replace(' ', '')
                         if list_lines[self._email_position].isdigit():
-                            # if the element is a number stores it on the dictionary and removes the cell
+                            # if the element is a number stores it and removes the cell
                             to_remove_phone_number = list_lines[self._email_position]
-                            if to_remove_phone_number not in dict_error[entity_id]['present']:
-                                dict_error[entity_id]['not_present'].append(to_remove_phone_number)
+                            if not contacts_present.has(entity_id, to_remove_phone_number):
+                                not_present.append(to_remove_phone_number)
                             list_lines.pop(self._email_position)
 
                 # Store last phone number
                 remaining_phone_number = list_lines[self._phone_number_position]
                 if len(remaining_phone_number) > 0:
-                    if remaining_phone_number not in dict_error[entity_id]['present']:
-                        dict_error[entity_id]['present'].append(list_lines[self._phone_number_position])
+                    contacts_present.add(entity_id, remaining_phone_number)
 
                 # Stores new lines
-                for number in dict_error[entity_id]['not_present']:
+                for number in not_present:
                     to_add_line = list_lines
                     to_add_line[self._phone_number_position] = number
                     self._corrected_lines.append(self._delimiter.join(to_add_line))
                     # logger.info("Added new line: {}".format(self._delimiter.join(to_add_line).strip()))
 
-                dict_error[entity_id]['present'].extend(dict_error[entity_id]['not_present'])
-                dict_error[entity_id]['not_present'] = []
+                for number in not_present:
+                    contacts_present.add(entity_id, number)
 
             # Replaces the corrected line
             self._corrected_lines[index] = self._delimiter.join(list_lines)
@@ -261,7 +312,7 @@ class FileCorrections:
         assert self._phone_number_position is not None, "This source doesn't have a phone number column"
         logger.info("Phone number correction process has started")
 
-        dict_contact = {}
+        contacts = self._contacts_phone_number
         for index in range(1, len(self._corrected_lines)):
             list_suppliers_lines = self._corrected_lines[index].split(self._delimiter)
             number_to_check = list_suppliers_lines[self._phone_number_position]
@@ -270,18 +321,15 @@ class FileCorrections:
                 list_suppliers_lines[self._phone_number_position] = list_numbers[0]
             elif len(list_numbers) > 1:
                 id_entity = list_suppliers_lines[0]
-                if id_entity not in dict_contact.keys():
-                    dict_contact[id_entity] = []
                 list_suppliers_lines[self._phone_number_position] = list_numbers[0]
-                dict_contact[id_entity].append(list_numbers[0])
+                contacts.add(id_entity, list_numbers[0])
                 for extra_number in list_numbers[1:]:
-                    if extra_number not in dict_contact[id_entity]:
+                    if contacts.add(id_entity, extra_number):
                         extra_line = list_suppliers_lines[:]
                         extra_line[self._phone_number_position] = extra_number
                         self._corrected_lines.append(self._delimiter.join(extra_line))
 
                         #logger.info("Added new line: {}".format(self._delimiter.join(extra_line).strip()))
-                        dict_contact[id_entity].append(extra_number)
             self._corrected_lines[index] = self._delimiter.join(list_suppliers_lines)
 
     def email(self) -> None:
@@ -302,7 +350,7 @@ class FileCorrections:
 
         logger.info("Email correction process has started")
 
-        dict_emails = {}
+        contacts = self._contacts_email
         for index in range(1, len(self._corrected_lines)):
             list_lines = self._corrected_lines[index].split(self._delimiter)
             email_pos = list_lines[self._email_position]
@@ -311,16 +359,13 @@ class FileCorrections:
                 list_lines[self._email_position] = emails[0]
             elif len(emails) > 1:
                 id_entity = list_lines[self._id_position]
-                if id_entity not in dict_emails.keys():
-                    dict_emails[id_entity] = []
                 list_lines[self._email_position] = emails[0]
-                dict_emails[id_entity].append(emails[0])
+                contacts.add(id_entity, emails[0])
                 for extra_email in emails[1:]:
-                    if extra_email not in dict_emails[id_entity]:
+                    if contacts.add(id_entity, extra_email):
                         extra_line = list_lines[:]
                         extra_line[self._email_position] = extra_email
                         self._corrected_lines.append(self._delimiter.join(extra_line))
-                        dict_emails[id_entity].append(extra_email)
             else:
                 list_lines[self._email_position] = ''
             self._corrected_lines[index] = self._delimiter.join(list_lines)
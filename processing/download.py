@@ -3,13 +3,42 @@ Different Methods to download data
 """
 import logging
 import os
+import shutil
+import sqlite3
 
 import pandas as pd
 from ..processing.workspace import DirectoryOperations
+from ..preparation.compaction import Compaction
+from ..processing.catalog import OutputCatalog, REGISTER_TIMEOUT
+from ..processing.fingerprint import SourceFingerprint
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# File types written with pyarrow, the dtypes are kept on the file
+COLUMNAR_TYPES = ['parquet', 'feather']
+
+# Codecs of each columnar file type, None is the default of pyarrow (snappy on parquet and lz4 on feather)
+VALID_COMPRESSIONS = {
+    'parquet': [None, 'none', 'snappy', 'gzip', 'brotli', 'lz4', 'zstd'],
+    'feather': [None, 'uncompressed', 'lz4', 'zstd']
+}
+
+# Inferred types of the object columns converted by pyarrow as they are, the other ones (e.g. mixed) are saved as
+# strings, see SaveData.arrow_table
+ARROW_OBJECT_TYPES = ['string', 'empty', 'bytes', 'boolean', 'integer', 'floating', 'mixed-integer-float', 'decimal',
+                      'date', 'datetime', 'time']
+
+# Standardized dates (%Y%m%d or %Y%m%d_%H%M%S) of the string cols used as partition col
+PARTITION_DATE_PATTERN = r'^\d{8}(_\d{6})?$'
+
+# Characters of the standardized dates (%Y%m%d_%H%M%S) on the key of each partition
+PARTITION_GRANULARITIES = {
+    'year': 4,
+    'month': 6,
+    'day': 8
+}
+
 
 class SaveData:
     @classmethod
@@ -17,9 +46,15 @@ class SaveData:
                    date_tag: str, path: str = r'N:\DSI\ASI4\ASI42\Partilha\Data\sources\clean_data',
                    product: str = "master",
                    delimiter: str = ',', encoding: str = 'UTF-8-SIG', file_type: str = 'csv',
-                   date_part: str = '') -> None:
+                   date_part: str = '', dtypes: dict = None, compression: str = None, row_group_size: int = None,
+                   partition_by: dict = None) -> None:
         """
-        Function to save file in csv
+        Function to save file in csv, parquet or feather
+        :param dtypes: dtype map saved alongside the csv file, so the readers restore the compacted dtypes
+        :param compression: codec of the parquet and feather files, see VALID_COMPRESSIONS
+        :param row_group_size: maximum rows of each row group (chunk on feather)
+        :param partition_by: col and granularity (year, month or day) of the partitions of a parquet file, the rows
+        are read back grouped by partition, see write_columnar_file
         :param date_part:
         :param file_type:
         :param df:
@@ -42,6 +77,38 @@ class SaveData:
         assert type(file_type) == str, "The file_type must be a string"
         assert type(date_part) == str,  "The date_part must be a string"
 
+        complete_path = cls.file_path(tag, date_tag, path, product, file_type, date_part)
+
+        if file_type in COLUMNAR_TYPES:
+            # The dtypes (nullable, categorical, dates) are kept on the schema, the dtype map isn't needed
+            cls.write_columnar_file(cls.arrow_table(df), complete_path, file_type, compression, row_group_size,
+                                    partition_by)
+        else:
+            df.to_csv(
+                complete_path,
+                sep=delimiter,
+                index=False,
+                encoding=encoding)
+            if dtypes is not None:
+                Compaction.save_dtypes(complete_path, dtypes)
+        cls.register(complete_path, path, tag, product, date_tag, date_part, len(df),
+                     {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+                     SourceFingerprint.file_hash(complete_path))
+
+        logger.info("Source updated")
+
+    @classmethod
+    def file_path(cls, tag: str, date_tag: str, path: str, product: str, file_type: str, date_part: str = '') -> str:
+        """
+        Builds the path of the file to save, creating the folders of the product and tag
+        :param tag:
+        :param date_tag:
+        :param path:
+        :param product:
+        :param file_type:
+        :param date_part:
+        :return:
+        """
         # Check directory path with product
         DirectoryOperations.check_dir(path, product)
 
@@ -62,15 +129,174 @@ class SaveData:
             logger.error(e)
             raise ValueError("The given str_time must be on the format: {0}".format("%Y%m%d_%H%M%S"))
 
-        df.to_csv(
-            os.path.join(complete_path,
-                         tag + '_' + date_tag + '.' + file_type),
-            sep=delimiter,
-            index=False,
-            encoding=encoding)
+        return os.path.join(complete_path, tag + '_' + date_tag + '.' + file_type)
+
+    @staticmethod
+    def arrow_table(df: pd.DataFrame):
+        """
+        pyarrow Table of a DataFrame. The object columns with values of different types (e.g. the columns not
+        standardized), which pyarrow can't convert, are saved as strings with the missing values kept
+        :param df:
+        :return: pyarrow Table
+        """
+        # pyarrow is only needed by the sources saved on columnar files
+        import pyarrow as pa
+
+        mixed = [col for col in df.columns if df[col].dtype == object and
+                 pd.api.types.infer_dtype(df[col], skipna=True) not in ARROW_OBJECT_TYPES]
+        if len(mixed) > 0:
+            logger.warning("The columns {} have values of different types, they are saved as strings".format(mixed))
+            df = df.copy(deep=False)
+            for col in mixed:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    @staticmethod
+    def write_columnar_file(table, complete_path: str, file_type: str = 'parquet', compression: str = None,
+                            row_group_size: int = None, partition_by: dict = None) -> None:
+        """
+        Saves a pyarrow Table in parquet or feather.
+        A partitioned parquet file is a folder with the name of the file and a subfolder by partition (Hive style, e.g.
+        dt_ref_month=202101/part-0.parquet), so it is still selected by tag and date_tag. The key of the partitions is
+        computed from the date col, which stays on the files. The rows of each partition keep the order of the table,
+        the partitions are read back by order of their key, so the rows come back grouped by partition
+        :param table: pyarrow Table
+        :param complete_path: see file_path
+        :param file_type: parquet or feather
+        :param compression: see VALID_COMPRESSIONS
+        :param row_group_size: maximum rows of each row group (chunk on feather)
+        :param partition_by: col and granularity (year, month or day), the col is a timestamp, a date or a string
+        with the standardized dates (see PARTITION_DATE_PATTERN)
+        :return:
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+        from pyarrow import feather
+
+        assert file_type in COLUMNAR_TYPES, "The file_type must be one of {}".format(COLUMNAR_TYPES)
+        assert compression in VALID_COMPRESSIONS[file_type], \
+            "The compression of {} files must be one of {}".format(file_type, VALID_COMPRESSIONS[file_type])
+        assert row_group_size is None or (type(row_group_size) == int and row_group_size > 0), \
+            "The row_group_size must be a positive int"
+
+        key = None
+        if partition_by is not None:
+            assert file_type == 'parquet', "Only the parquet files can be partitioned"
+            assert type(partition_by) == dict and 'col' in partition_by.keys(), \
+                "The partition_by must be a dictionary with the col"
+            col = partition_by['col']
+            granularity = partition_by.get('granularity', 'month')
+            assert col in table.column_names, "The partition col {} isn't on the source".format(col)
+            assert granularity in PARTITION_GRANULARITIES.keys(), \
+                "The granularity must be one of {}".format(list(PARTITION_GRANULARITIES.keys()))
+
+            dates = table.column(col)
+            if pa.types.is_timestamp(dates.type) or pa.types.is_date(dates.type):
+                dates = pc.strftime(dates, format='%Y%m%d')
+            else:
+                assert pa.types.is_string(dates.type) or pa.types.is_large_string(dates.type), \
+                    "The partition col {} must have dates, it has {}".format(col, dates.type)
+                # The key is a slice of the date, only right on the standardized dates (e.g. not on 2020-01-31)
+                standardized = pc.or_(pc.match_substring_regex(dates, PARTITION_DATE_PATTERN), pc.equal(dates, ''))
+                assert pc.all(standardized).as_py() is not False, \
+                    "The partition col {} must have the dates on the format %Y%m%d or %Y%m%d_%H%M%S".format(col)
+            key = pc.utf8_slice_codeunits(dates.cast(pa.string()), 0, PARTITION_GRANULARITIES[granularity])
+            # The rows without date go to the default partition of Hive
+            key = pc.if_else(pc.equal(key, ''), pa.scalar(None, pa.string()), key)
+            key_col = '{}_{}'.format(col, granularity)
+
+        # The file of the same date_tag is replaced, as the csv
+        if os.path.isdir(complete_path):
+            shutil.rmtree(complete_path)
+        elif os.path.exists(complete_path):
+            os.remove(complete_path)
+
+        if file_type == 'feather':
+            feather.write_feather(table, complete_path, compression=compression, chunksize=row_group_size)
+        elif key is None:
+            pq.write_table(table, complete_path, compression=compression or 'snappy', row_group_size=row_group_size)
+        else:
+            options = dict(max_rows_per_group=row_group_size, min_rows_per_group=0) if row_group_size else {}
+            # One thread, so the rows are written on the order of the table
+            pq.write_to_dataset(table.append_column(key_col, key), complete_path, partition_cols=[key_col],
+                                basename_template='part-{i}.parquet', compression=compression or 'snappy',
+                                use_threads=False, **options)
+
+    @classmethod
+    def write_arrow_file(cls, table, tag: str, date_tag: str,
+                         path: str = r'N:\DSI\ASI4\ASI42\Partilha\Data\sources\clean_data',
+                         product: str = "master", delimiter: str = ',', encoding: str = 'UTF-8-SIG',
+                         file_type: str = 'csv', date_part: str = '', dtypes: dict = None, compression: str = None,
+                         row_group_size: int = None, partition_by: dict = None) -> None:
+        """
+        Function to save a pyarrow Table in csv, parquet or feather, with the same path and name as write_file
+        :param table: pyarrow Table
+        :param tag:
+        :param date_tag:
+        :param path:
+        :param product:
+        :param delimiter:
+        :param encoding:
+        :param file_type:
+        :param date_part:
+        :param dtypes: see write_file, see ArrowStandardization.dtype_map
+        :param compression: see write_file
+        :param row_group_size: see write_file
+        :param partition_by: see write_file
+        :return:
+        """
+        # pyarrow is only needed by the sources on the arrow backend
+        from pyarrow import csv
+
+        logger.info('Saving file')
+        assert type(tag) == str, "The tag parameter must be a string"
+        assert type(date_tag) == str, "The date_tag parameter must be a string"
+        assert type(path) == str, "The path must be a string"
+        assert type(delimiter) == str, "The delimiter must be a string"
+        assert encoding.upper() in ['UTF-8', 'UTF8', 'UTF-8-SIG'], "The arrow backend only writes UTF-8"
+        assert file_type in ['csv'] + COLUMNAR_TYPES, \
+            "The arrow backend only writes {} files".format(['csv'] + COLUMNAR_TYPES)
+
+        complete_path = cls.file_path(tag, date_tag, path, product, file_type, date_part)
+        if file_type in COLUMNAR_TYPES:
+            cls.write_columnar_file(table, complete_path, file_type, compression, row_group_size, partition_by)
+        else:
+            with open(complete_path, 'wb') as file:
+                if encoding.upper() == 'UTF-8-SIG':
+                    file.write(b'\xef\xbb\xbf')
+                csv.write_csv(table, file, write_options=csv.WriteOptions(delimiter=delimiter))
+            if dtypes is not None:
+                Compaction.save_dtypes(complete_path, dtypes)
+        cls.register(complete_path, path, tag, product, date_tag, date_part, table.num_rows,
+                     {field.name: str(field.type) for field in table.schema},
+                     SourceFingerprint.file_hash(complete_path))
 
         logger.info("Source updated")
 
+    @staticmethod
+    def register(complete_path: str, path: str, tag: str, product: str, date_tag: str, date_part: str, rows: int,
+                 schema: dict, content_hash: str = None) -> None:
+        """
+        Registers an output on the catalog of the root folder, so the readers find it without listing the folder.
+        The output is already written, when the catalog isn't available it is only found by listing the folder
+        :param complete_path: path of the output
+        :param path: root folder of the outputs
+        :param tag:
+        :param product:
+        :param date_tag:
+        :param date_part:
+        :param rows:
+        :param schema: dtype of each column
+        :param content_hash: see SourceFingerprint.file_hash
+        :return:
+        """
+        try:
+            with OutputCatalog(path, timeout=REGISTER_TIMEOUT) as catalog:
+                catalog.register(complete_path, tag, product, date_tag, date_part, rows, schema, content_hash)
+        except sqlite3.Error as e:
+            logger.warning("{} not registered on the catalog: {}".format(complete_path, e))
+
     @classmethod
     def write_table(cls, df: pd.DataFrame, tag: str, date_tag: str) -> None:
         """
@@ -0,0 +1,142 @@
+"""
+Fingerprint of the inputs of a processed source, saved on a manifest alongside the output file
+"""
+import hashlib
+import json
+import logging
+import os
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Bytes read at a time to hash a file
+HASH_CHUNK = 1024 * 1024
+
+
+class SourceFingerprint:
+    """
+    The manifest of an output has the raw input path, size, modification time and content hash, the hash of the
+    yaml of the source and the version of the code. A source with the same fingerprint doesn't need to be processed
+    again.
+    """
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        """
+        SHA-256 of the content of a file, or of the names and contents of the files of a folder (partitioned outputs)
+        :param path:
+        :return:
+        """
+        file_hash = hashlib.sha256()
+        if os.path.isdir(path):
+            paths = sorted(os.path.join(folder, x) for folder, _, files in os.walk(path) for x in files)
+        else:
+            paths = [path]
+        for file_path in paths:
+            if file_path != path:
+                file_hash.update(os.path.relpath(file_path, path).replace('\\', '/').encode('utf8'))
+            with open(file_path, 'rb') as file:
+                for chunk in iter(lambda: file.read(HASH_CHUNK), b''):
+                    file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def config_hash(source_setup: dict) -> str:
+        """
+        Hash of the yaml of the source, as read by read_yaml
+        :param source_setup:
+        :return:
+        """
+        return hashlib.sha256(json.dumps(source_setup, sort_keys=True, default=str).encode('utf8')).hexdigest()
+
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def code_version() -> str:
+        """
+        Hash of the python files of the package, computed once by process
+        :return:
+        """
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code_hash = hashlib.sha256()
+        for folder, folders, files in os.walk(root):
+            folders[:] = sorted(x for x in folders if not x.startswith('.') and x != '__pycache__')
+            for file_name in sorted(x for x in files if x.endswith('.py')):
+                path = os.path.join(folder, file_name)
+                code_hash.update(os.path.relpath(path, root).replace('\\', '/').encode('utf8'))
+                with open(path, 'rb') as file:
+                    code_hash.update(file.read().replace(b'\r\n', b'\n'))
+        return code_hash.hexdigest()
+
+    @classmethod
+    def build(cls, raw_path: str, config_hash: str, content_hash: str = None) -> dict:
+        """
+        Fingerprint of the inputs of a source
+        :param raw_path: raw input file
+        :param config_hash: see config_hash
+        :param content_hash: hash of the raw file, when it is already known
+        :return:
+        """
+        stat = os.stat(raw_path)
+        return {'raw_path': os.path.abspath(raw_path),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'content_hash': content_hash if content_hash is not None else cls.file_hash(raw_path),
+                'config_hash': config_hash,
+                'code_version': cls.code_version()}
+
+    @staticmethod
+    def manifest_path(output_path: str) -> str:
+        """
+        Path of the manifest of an output. The file is hidden, so it isn't selected as a version of the source
+        :param output_path:
+        :return:
+        """
+        folder, file_name = os.path.split(output_path)
+        return os.path.join(folder, '.{}.manifest.json'.format(file_name))
+
+    @classmethod
+    def save(cls, output_path: str, fingerprint: dict) -> None:
+        with open(cls.manifest_path(output_path), 'w') as file:
+            json.dump(fingerprint, file, indent=4)
+
+    @classmethod
+    def read(cls, output_path: str) -> dict or None:
+        """
+        Manifest of an output
+        :param output_path:
+        :return: None when the output doesn't have one
+        """
+        path = cls.manifest_path(output_path)
+        if len(output_path) == 0 or not os.path.exists(path):
+            return None
+        with open(path) as file:
+            return json.load(file)
+
+    @classmethod
+    def matches(cls, output_path: str, raw_path: str, config_hash: str) -> bool:
+        """
+        Checks if the output was processed from the same inputs.
+        When only the modification time of the raw file changed, its content is hashed and compared, and the manifest
+        is updated when the content is the same
+        :param output_path: last output of the source
+        :param raw_path: raw input file
+        :param config_hash: see config_hash
+        :return:
+        """
+        manifest = cls.read(output_path)
+        if manifest is None:
+            return False
+        stat = os.stat(raw_path)
+        same_inputs = manifest['raw_path'] == os.path.abspath(raw_path) and manifest['size'] == stat.st_size \
+            and manifest['config_hash'] == config_hash and manifest['code_version'] == cls.code_version()
+        if not same_inputs:
+            return False
+        if manifest['mtime'] == stat.st_mtime_ns:
+            return True
+
+        content_hash = cls.file_hash(raw_path)
+        if content_hash != manifest['content_hash']:
+            return False
+        logger.info("The raw file {} was touched without changes".format(raw_path))
+        cls.save(output_path, cls.build(raw_path, config_hash, content_hash))
+        return True
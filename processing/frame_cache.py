@@ -0,0 +1,156 @@
+"""
+In-process cache of the DataFrames read by PackageOperations.read_source
+"""
+import collections
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bytes of the DataFrames kept on the cache by default
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+VALID_MODES = ['copy', 'read_only']
+
+
+class FrameCache:
+    """
+    DataFrames of the files read, by path, modification time and size of the file and of its dtype map (see
+    Compaction.dtypes_path), with at most max_bytes on memory.
+    The least recently used DataFrames are evicted first, and a new version of a file replaces the previous one.
+    The cached DataFrames are never returned, so the callers can't change them:
+    - copy: a deep copy, the caller can change it as a DataFrame read from the file;
+    - read_only: a shallow copy with the data read-only, without copying it. Adding or replacing columns works, the
+    changes in place (e.g. df.loc[...] = ..., fillna(inplace=True)) raise a ValueError. It relies on the blocks of
+    pandas 1.5, the columns it can't set as read-only (e.g. Arrow-backed strings) are copied on each read.
+    Usage, opt-in by process:
+    PackageOperations.cache = FrameCache(max_bytes=4 * 1024 ** 3, mode='read_only')
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, mode: str = 'copy') -> None:
+        """
+        :param max_bytes: bytes of the DataFrames kept, see Compaction.memory_bytes
+        :param mode: copy or read_only
+        """
+        assert type(max_bytes) == int and max_bytes > 0, "The max_bytes must be a positive int"
+        assert mode in VALID_MODES, "The mode must be one of {}".format(VALID_MODES)
+        self._max_bytes = max_bytes
+        self._mode = mode
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(path: str) -> tuple:
+        """
+        Path, modification time and size of the file and of its dtype map, which changes the dtypes read
+        :param path:
+        :return:
+        """
+        from ..preparation.compaction import Compaction
+
+        stat = os.stat(path)
+        try:
+            dtypes_stat = os.stat(Compaction.dtypes_path(path))
+            dtypes_key = (dtypes_stat.st_mtime_ns, dtypes_stat.st_size)
+        except FileNotFoundError:
+            dtypes_key = None
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size, dtypes_key
+
+    @staticmethod
+    def read_only(df: pd.DataFrame) -> list:
+        """
+        Sets the arrays of the DataFrame as read-only: numpy, nullable, datetime and categorical. Uses the blocks of
+        pandas 1.5 (df._mgr.blocks) and the numpy arrays inside the extension arrays
+        :param df:
+        :return: positions of the columns not set as read-only, e.g. Arrow-backed strings
+        """
+        writable = []
+        for block in df._mgr.blocks:
+            values = block.values
+            frozen = False
+            for array in [values, getattr(values, '_data', None), getattr(values, '_mask', None),
+                          getattr(values, '_ndarray', None), getattr(values, '_codes', None)]:
+                if isinstance(array, np.ndarray):
+                    array.flags.writeable = False
+                    frozen = True
+            if not frozen:
+                writable.extend(block.mgr_locs.as_array.tolist())
+        return sorted(writable)
+
+    def share(self, df: pd.DataFrame, writable: list) -> pd.DataFrame:
+        """
+        Copy of a cached DataFrame, see the modes
+        :param df:
+        :param writable: positions of the columns not read-only, copied on the read_only mode
+        :return:
+        """
+        if self._mode == 'copy':
+            return df.copy()
+        shared = df.copy(deep=False)
+        for i in writable:
+            shared.isetitem(i, df.iloc[:, i].copy())
+        return shared
+
+    def read(self, path: str, loader) -> pd.DataFrame:
+        """
+        DataFrame of the file, from the cache or read by the loader
+        :param path: file read
+        :param loader: function that reads the file
+        :return:
+        """
+        from ..preparation.compaction import Compaction
+
+        key = self.key(path)
+        with self._lock:
+            if key in self._entries.keys():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                cached, writable, _ = self._entries[key]
+                return self.share(cached, writable)
+            self._misses += 1
+
+        df = loader()
+        size = Compaction.memory_bytes(df)
+        if size > self._max_bytes:
+            logger.info("{} has {:.1f}MB, more than the cache".format(path, size / 1024 ** 2))
+            return df
+        # The DataFrame read is the one cached, the caller gets it as on the hits
+        writable = self.read_only(df)
+
+        with self._lock:
+            # Previous versions of the file
+            for old_key in [x for x in self._entries.keys() if x[0] == key[0]]:
+                self._bytes -= self._entries.pop(old_key)[2]
+            while self._bytes + size > self._max_bytes:
+                old_key, (_, _, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self._evictions += 1
+                logger.info("{} evicted from the cache".format(old_key[0]))
+            self._entries[key] = (df, writable, size)
+            self._bytes += size
+        return self.share(df, writable)
+
+    def stats(self) -> dict:
+        """
+        Statistics of the cache
+        :return: hits, misses, evictions, entries and bytes
+        """
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses, 'evictions': self._evictions,
+                    'entries': len(self._entries), 'bytes': self._bytes}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
@@ -5,12 +5,27 @@ import logging
 import os
 import re
 import pandas as pd
-from ..processing.connectors import NetezzaConn
 
 logger = logging.getLogger(__name__)
 
+# Connections kept open on the process by (user, env), see ReadFiles.keep_connections
+CONNECTIONS = {}
+
 
 class ReadFiles:
+    # Reuse the connection of the user on the next queries of the process, e.g. on a backfill. The temporary tables
+    # created by a query are dropped after it, so the next query can create them again
+    keep_connections = False
+
+    @staticmethod
+    def close_connections() -> None:
+        """
+        Closes the connections kept by the process
+        :return:
+        """
+        while len(CONNECTIONS) > 0:
+            _, conn = CONNECTIONS.popitem()
+            conn.close()
 
     @classmethod
     def excel(cls, path: str = "./../Confirming_facturas2018.xlsx", sheet_number: int = 0, header_row: int = 0,
@@ -80,6 +95,66 @@ class ReadFiles:
                                      dtype=d_type)
         return pd_content
 
+    @staticmethod
+    def arrow_data_file(path: str, header_row: int = 0, delimiter: str = ",", encoding: str = 'utf8', quote='"',
+                        change_name_init_cols=None):
+        """
+        Import txt files to a pyarrow Table with every column as string, as data_file does with d_type=object
+        :param path: path to the file
+        :param header_row:
+        :param delimiter:
+        :param encoding:
+        :param quote:
+        :param change_name_init_cols:
+        :return: pyarrow Table
+        """
+        # pyarrow is only needed by the sources on the arrow backend
+        import pyarrow as pa
+        from pyarrow import csv
+
+        assert os.path.exists(path), "The given path must exist"
+        if encoding.lower() in ['utf', 'utf-8-sig', 'utf_8_sig']:
+            # The BOM is removed by the arrow reader
+            encoding = 'utf8'
+
+        if change_name_init_cols is not None:
+            assert type(change_name_init_cols) == list, "The change_name_init_cols must be a list"
+            names = change_name_init_cols
+            read_options = csv.ReadOptions(column_names=names, skip_rows=header_row + 1, encoding=encoding)
+        else:
+            # Only the first block is read to get the header
+            names = csv.open_csv(path, read_options=csv.ReadOptions(skip_rows=header_row, encoding=encoding),
+                                 parse_options=csv.ParseOptions(delimiter=delimiter, quote_char=quote)).schema.names
+            read_options = csv.ReadOptions(skip_rows=header_row, encoding=encoding)
+
+        # Every column is read as string, the empty values as null like in pandas
+        convert_options = csv.ConvertOptions(column_types={name: pa.string() for name in names},
+                                             strings_can_be_null=True)
+        parse_options = csv.ParseOptions(delimiter=delimiter, quote_char=quote,
+                                         invalid_row_handler=lambda row: 'skip')
+        return csv.read_csv(path, read_options=read_options, parse_options=parse_options,
+                            convert_options=convert_options)
+
+    @staticmethod
+    def columnar_file(path: str, columns: list = None) -> pd.DataFrame:
+        """
+        Import parquet and feather files, with the dtypes they were saved with
+        :param path: path to the file, or to the folder of a partitioned parquet file
+        :param columns: only these columns are read
+        :return:
+        """
+        # pyarrow is only needed by the sources saved on columnar files
+        import pyarrow.parquet as pq
+        from pyarrow import feather
+
+        assert os.path.exists(path), "The given path must exist"
+        if path.lower().endswith('.feather'):
+            table = feather.read_table(path, columns=columns)
+        else:
+            # The keys of the partitions aren't read, they are a copy of the date col. The rows come by partition
+            table = pq.read_table(path, columns=columns, partitioning=None)
+        return table.to_pandas()
+
     @staticmethod
     def raw(path_file: str = "", file_encoding: str = "ANSI") -> list:
         """
@@ -120,10 +195,28 @@ class ReadFiles:
         :param query_params: parameters to change the query
         :return:
         """
+        # pyodbc is only needed by the sources read from queries
+        from ..processing.connectors import NetezzaConn
 
-        conn = NetezzaConn(user, password, env)
-        conn.create()
-        df = conn.select_query(query_path, package, columns_name, **query_params)
+        if ReadFiles.keep_connections and (user, env) in CONNECTIONS.keys():
+            conn = CONNECTIONS[(user, env)]
+        else:
+            conn = NetezzaConn(user, password, env)
+            conn.create()
+            if ReadFiles.keep_connections:
+                CONNECTIONS[(user, env)] = conn
+        try:
+            df = conn.select_query(query_path, package, columns_name, **query_params)
+        finally:
+            if ReadFiles.keep_connections:
+                conn.drop_temp_tables()
+            else:
+                conn.close()
+        if df is None:
+            # The error of the database was logged by select_query, the session may not be usable anymore
+            if CONNECTIONS.get((user, env)) is conn:
+                CONNECTIONS.pop((user, env)).close()
+            raise ValueError("The query {} failed on the database".format(query_path))
         return df
 
     @staticmethod
@@ -0,0 +1,19 @@
+"""
+Setup of the processes of the pools of the command line tools (backfill, watch_sources)
+"""
+import multiprocessing.util
+
+
+def init_worker(keep_connections: bool) -> None:
+    """
+    Initializer of the processes of the pools
+    :param keep_connections: reuse the database connection on the sources processed by the process
+    :return:
+    """
+    # Imported on the worker, the processes that only start the pool don't load pandas
+    from ..processing.upload import ReadFiles
+
+    ReadFiles.keep_connections = keep_connections
+    if keep_connections:
+        # The workers of the pool exit without the atexit functions, the finalizers of multiprocessing do run
+        multiprocessing.util.Finalize(None, ReadFiles.close_connections, exitpriority=10)
@@ -2,18 +2,23 @@
 Modules that manages the different sources
 Improve : Add workspace validation
 """
+import bisect
 import logging
 import os
 import pkgutil
+import time
 from datetime import datetime
 
-import pandas as pd
 import yaml
 
-from ..processing.upload import ReadFiles
-
 logger = logging.getLogger(__name__)
 
+# Sorted names of the entries of each folder listed, by absolute path, with the modification time of the folder
+DIRECTORY_INDEXES = {}
+
+# Seconds a folder must be unchanged to keep its index, the modification time of network shares isn't precise
+INDEX_MTIME_RESOLUTION = 2
+
 
 class DirectoryOperations:
     """
@@ -21,7 +26,43 @@ class DirectoryOperations:
     """
 
     @staticmethod
-    def select_recent_file(dir_path: str, tag_file: str) -> str:
+    def directory_index(dir_path: str) -> list:
+        """
+        Sorted names of the entries of the folder. The folder is scanned once and again only when its modification time
+        changes, so the selections of files of the same folder don't list it each time
+        :param dir_path:
+        :return:
+        """
+        key = os.path.abspath(dir_path)
+        mtime = os.stat(key).st_mtime_ns
+        if key in DIRECTORY_INDEXES.keys() and DIRECTORY_INDEXES[key][0] == mtime:
+            return DIRECTORY_INDEXES[key][1]
+
+        scan_time = time.time_ns()
+        with os.scandir(key) as entries:
+            names = sorted(entry.name for entry in entries)
+        # A file added right after the scan may not change the modification time, the index is only kept when the
+        # folder was unchanged for a while
+        if scan_time - mtime > INDEX_MTIME_RESOLUTION * 10 ** 9:
+            DIRECTORY_INDEXES[key] = (mtime, names)
+        else:
+            DIRECTORY_INDEXES.pop(key, None)
+        return names
+
+    @staticmethod
+    def tag_range(names: list, tag_file: str) -> tuple:
+        """
+        Positions of the names that start with tag_file, consecutive on the sorted names
+        :param names: see directory_index
+        :param tag_file:
+        :return: first and last (excluded) position
+        """
+        start = bisect.bisect_left(names, tag_file)
+        end = bisect.bisect_left(names, tag_file + chr(0x10FFFF), start)
+        return start, end
+
+    @classmethod
+    def select_recent_file(cls, dir_path: str, tag_file: str) -> str:
         """
          Select the most recent files
          :param tag_file:
@@ -29,16 +70,15 @@ class DirectoryOperations:
          :return:
          """
         assert os.path.exists(dir_path), "The {0} doesn't exist".format(dir_path)
-        files = os.listdir(dir_path)
-        files = [f for f in files if f.startswith(tag_file)]
-        files.sort(reverse=True)
-        if len(files) > 0:
-            return os.path.join(dir_path, files[0])
+        names = cls.directory_index(dir_path)
+        start, end = cls.tag_range(names, tag_file)
+        if end > start:
+            return os.path.join(dir_path, names[end - 1])
         else:
             return ''
 
-    @staticmethod
-    def select_files(dir_path: str, tag_file: str) -> list:
+    @classmethod
+    def select_files(cls, dir_path: str, tag_file: str) -> list:
         """
          Select the most recent files
          :param tag_file:
@@ -47,9 +87,9 @@ class DirectoryOperations:
          """
 
         assert os.path.exists(dir_path), "The {0} doesn't exist".format(dir_path)
-        files = os.listdir(dir_path)
-        files = [f for f in files if f.startswith(tag_file)]
-        return files
+        names = cls.directory_index(dir_path)
+        start, end = cls.tag_range(names, tag_file)
+        return names[start:end]
 
     @staticmethod
     def check_dir(dir_path: str, *folder_name: str) -> None:
@@ -65,8 +105,8 @@ class DirectoryOperations:
             if not os.path.exists(dir_path):
                 os.mkdir(dir_path)
 
-    @staticmethod
-    def select_file_by_date(dir_path: str, tag_file: str, date_file: str) -> str:
+    @classmethod
+    def select_file_by_date(cls, dir_path: str, tag_file: str, date_file: str) -> str:
         """
         Select the file by date
         :param dir_path:
@@ -80,16 +120,15 @@ class DirectoryOperations:
         except ValueError:
             raise ValueError("Incorrect data format, should be YYYYMMDD")
 
-        files = os.listdir(dir_path)
-        files = [f for f in files if f.startswith(tag_file)]
-
-        files_equal_date = [x for x in files if date_file in x]
-        files_equal_date.sort(reverse=True)
+        names = cls.directory_index(dir_path)
+        start, end = cls.tag_range(names, tag_file)
+        # The date can be anywhere on the name, the last file of the tag with it is selected
+        files_equal_date = [names[i] for i in range(end - 1, start - 1, -1) if date_file in names[i]]
 
         return os.path.join(dir_path, files_equal_date[0])
 
-    @staticmethod
-    def select_close_file_by_date(dir_path: str, tag_file: str, lim_date: str, date_format: str = "%Y%m%d_%H%M%S",
+    @classmethod
+    def select_close_file_by_date(cls, dir_path: str, tag_file: str, lim_date: str, date_format: str = "%Y%m%d_%H%M%S",
                                   structure: str = '{}_{}.csv') -> str:
         """
         Select the file by date
@@ -108,28 +147,52 @@ class DirectoryOperations:
         except ValueError:
             raise ValueError("Incorrect data format, should be {}".format(date_format))
 
-        files = os.listdir(dir_path)
-        files = [f for f in files if f.startswith(tag_file)]
-
-        # Copy file
-        structure = structure.format(tag_file, lim_date)
-        files.append(structure)
-        files.sort()
+        return cls.select_close_files_by_dates(dir_path, tag_file, [lim_date], date_format, structure)[lim_date]
 
-        # Cut list on structure located
-        lim_list = files.index(structure)
+    @classmethod
+    def select_close_files_by_dates(cls, dir_path: str, tag_file: str, lim_dates: list,
+                                    date_format: str = "%Y%m%d_%H%M%S", structure: str = '{}_{}.csv') -> dict:
+        """
+        Same as select_close_file_by_date for a list of dates, listing the folder once
+        :param dir_path:
+        :param tag_file:
+        :param lim_dates:
+        :param date_format:
+        :param structure:
+        :return: selected file of each date
+        """
+        assert type(dir_path) == str, "The {0} doesn't exist".format(dir_path)
+        assert type(lim_dates) == list, "The lim_dates must be a list"
+        for lim_date in lim_dates:
+            try:
+                datetime.strptime(lim_date, date_format)
+            except ValueError:
+                raise ValueError("Incorrect data format, should be {}".format(date_format))
 
-        return os.path.join(dir_path, files[lim_list - 1])
+        names = cls.directory_index(dir_path)
+        start, end = cls.tag_range(names, tag_file)
+        selected = {}
+        for lim_date in lim_dates:
+            date_structure = structure.format(tag_file, lim_date)
+            # File before the structure of the date among the files of the tag, the last one when there is none
+            position = bisect.bisect_left(names, date_structure, start, end)
+            if position > start:
+                selected[lim_date] = os.path.join(dir_path, names[position - 1])
+            else:
+                selected[lim_date] = os.path.join(dir_path, names[end - 1] if end > start else date_structure)
+        return selected
 
 
 class PackageOperations:
     """
     Class to perform action package depend
     """
+    # FrameCache of the sources read by the process, e.g. PackageOperations.cache = FrameCache(). None doesn't cache
+    cache = None
 
-    @staticmethod
-    def read_source(package_name: str, source_name: str, file_name=None, selection_mode: str = 'recent',
-                    filter_date=None) -> tuple or pd.DataFrame:
+    @classmethod
+    def read_source(cls, package_name: str, source_name: str, file_name=None, selection_mode: str = 'recent',
+                    filter_date=None) -> 'tuple or pd.DataFrame':
         """
         Function to read sources from local or other
         :param filter_date:
@@ -139,6 +202,7 @@ class PackageOperations:
         :param file_name:
         :return:
         """
+        from ..processing.catalog import OutputCatalog
 
         try:
             assert type(package_name) == str, "The given package must be a string"
@@ -191,13 +255,16 @@ class PackageOperations:
                     result = []
                     # When it is given a list of files to extract
                     for i in file_name:
-                        # Extract the most recent file
+                        # Extract the most recent file, or the most recent of a specific date, from the catalog
                         if selection_mode == 'recent':
-                            source_path = DirectoryOperations.select_recent_file(file_path, i)
-                        # Extract a file with a specific date
+                            source_path = OutputCatalog.select_recent_file(source_load_params['path'], file_path, i)
+                        else:
+                            source_path = OutputCatalog.select_recent_file(source_load_params['path'], file_path, i,
+                                                                           filter_date)
+                        if cls.cache is not None:
+                            df = cls.cache.read(source_path, lambda: cls.read_file(source_path))
                         else:
-                            source_path = DirectoryOperations.select_file_by_date(file_path, i, filter_date)
-                        df = ReadFiles.data_file(source_path, encoding='utf-8-sig', decimal='.', d_type=None)
+                            df = cls.read_file(source_path)
                         result.append(df)
                     if len(result) == 1:
                         return result[0]
@@ -209,3 +276,24 @@ class PackageOperations:
 
         except AssertionError as e:
             logger.error(e)
+
+    @staticmethod
+    def read_file(source_path: str) -> 'pd.DataFrame':
+        """
+        Reads an output file, restoring the dtypes of the compacted sources
+        :param source_path:
+        :return:
+        """
+        # pandas is only loaded to read the sources, the DirectoryOperations are used before deciding to process one
+        from ..processing.upload import ReadFiles
+        from ..preparation.compaction import Compaction
+
+        if source_path.lower().endswith(('.parquet', '.feather')):
+            return ReadFiles.columnar_file(source_path)
+        dtypes = Compaction.read_dtypes(source_path)
+        if dtypes is None:
+            return ReadFiles.data_file(source_path, encoding='utf-8-sig', decimal='.', d_type=None)
+        # Compacted source, the dtypes are restored while reading
+        df = ReadFiles.data_file(source_path, encoding='utf-8-sig', decimal='.',
+                                 d_type=Compaction.read_csv_dtypes(dtypes))
+        return Compaction.restore(df, dtypes)